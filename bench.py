@@ -0,0 +1,276 @@
+''' Benchmarks for the Domaille recipe library.
+
+Builds synthetic Domaille trees in a temporary directory and times
+reading, writing, refreshing and wiping them. Every result reports
+files per second and peak traced memory, and can be saved as JSON to
+compare against a run from another revision.
+
+Usage:
+    python bench.py                                 # 10 and 1k recipes
+    python bench.py --recipes 10 1000 50000 --json results.json
+    python bench.py --compare baseline.json --json results.json
+    python bench.py --dir E:/ --workers 16          # an existing library
+'''
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from obj import STEP_CODEC, Dommaile, Path, Recipe, RecipeList, RecipeStep, Settings
+
+
+FILMS = ['<None>', 'Brown 5um', 'Purple 1um', 'Clear FOS-22']
+PADS = ['<None>', '60 Duro Blue', '70 Duro Violet', '75 Duro Brown', '90 Duro Black']
+LUBRICANTS = ['<None>', 'DI Water']
+
+
+def synthetic_recipes(recipes:int, min_steps:int = 1, max_steps:int = 9,
+                      seed:int = 0):
+    '''yields reproducible random recipes named recipe00000, recipe00001...'''
+    rng = random.Random(seed)
+    for n in range(recipes):
+        no_of_steps = rng.randint(min_steps, max_steps)
+        steps = [RecipeStep(rng.randrange(10, 300, 5),
+                            rng.choice((rng.randint(0, 16), rng.randint(0, 32) / 2)),
+                            speed=rng.randrange(60, 121, 10),
+                            film=rng.choice(FILMS), pad=rng.choice(PADS),
+                            lubricant=rng.choice(LUBRICANTS),
+                            description1=f"part {rng.randint(1000, 9999)}")
+                 for _ in range(no_of_steps)]
+        yield Recipe(f"recipe{n:05}", no_of_steps, rng.randint(2, 32),
+                     rng.randint(1, no_of_steps), *steps)
+
+
+def make_tree(directory:str, recipes:int, min_steps:int = 1, max_steps:int = 9,
+              seed:int = 0) -> int:
+    '''writes a synthetic Domaille tree with the given number of recipes,
+       returns the number of files written'''
+    files = 1
+    with contextlib.redirect_stdout(io.StringIO()):
+        Path.write(directory)
+        Settings.default().write(directory)
+        for recipe in synthetic_recipes(recipes, min_steps, max_steps, seed):
+            recipe.write(directory)
+            files += 1 + len(recipe)
+    return files
+
+
+def count_files(directory:str) -> int:
+    return sum(len(files) for _, _, files in
+               os.walk(f"{directory}{os.sep}Domaille"))
+
+
+def count_recipes(directory:str) -> int:
+    '''the number of recipe headers, the files a lazy read opens'''
+    with os.scandir(f"{directory}{os.sep}Domaille{os.sep}Processes") as entries:
+        return sum(1 for entry in entries if entry.is_file())
+
+
+def measure(name:str, files:int, function, *args, repeatable:bool = True,
+            **kwargs) -> dict:
+    '''times one call of function, returns a result record
+
+       tracemalloc slows Python down several times over, so the peak
+       memory comes from a second, traced call: function has to start
+       from scratch each time, pass a factory rather than a method of
+       an object the call fills in. Operations that change the library
+       (repeatable=False) have no peak memory'''
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        seconds = time.perf_counter() - start
+        peak = None
+        if repeatable:
+            tracemalloc.start()
+            function(*args, **kwargs)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    return {'name': name, 'seconds': seconds, 'files': files,
+            'files_per_second': files / seconds if seconds else None,
+            'peak_bytes': peak, 'result': result}
+
+
+def touch(directory:str, recipes:RecipeList, fraction:float = 0.01) -> int:
+    '''rewrites a fraction of the recipes with a changed step on disk,
+       returns the number of files rewritten'''
+    files = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        for recipe in recipes[::max(1, int(1 / fraction))]:
+            recipe = Recipe.read(recipe._source[0], directory)
+            recipe[1].time = recipe[1].time + 5
+            recipe.write(directory)
+            files += 1 + len(recipe)
+    time.sleep(0.01)    # let coarse mtimes move on
+    return files
+
+
+def suite(directory:str, recipes:int, workers:int, seed:int = 0) -> list:
+    '''times every library operation on a fresh synthetic tree'''
+    files = make_tree(directory, recipes, seed=seed)
+    results = []
+    def record(result):
+        result['recipes'] = recipes
+        results.append(result)
+        rate = result['files_per_second'] or 0
+        peak = (f"{result['peak_bytes'] / 2**20:9.1f} MiB"
+                if result['peak_bytes'] is not None else f"{'-':>13}")
+        print(f"{recipes:>7} {result['name']:<18} {result['seconds']:9.3f}s "
+              f"{rate:11.0f} files/s {peak}  {result.pop('note', '')}")
+
+    # a new list for every call, read() appends to the list it is called on
+    read = lambda *args, **kwargs: RecipeList().read(directory, *args, **kwargs)
+    result = measure('read', files, read)
+    library = result['result']
+    record(result)
+    record(measure(f'read {workers} workers', files, read, workers))
+    record(measure('read lazy', recipes, read, lazy=True))
+    record(measure('read interned', files, read, intern=True))
+    record(measure('refresh unchanged', files, library.refresh))
+    changed = touch(directory, library)
+    result = measure('refresh 1%', files, library.refresh, repeatable=False)
+    result['note'] = f"{len(result['result'].modified)} modified"
+    record(result)
+
+    library[0][1].time = library[0][1].time + 5
+    record(measure('write 1 dirty', 1 + len(library[0]), library.write, directory,
+                   repeatable=False))
+    record(measure('write all', files - 1, library.write, directory, True))
+    result = measure('wipe', files, Dommaile.wipe, directory, repeatable=False)
+    result['note'] = f"{count_files(directory)} files left"
+    record(result)
+    for result in results:
+        result['result'] = repr(result['result'])[:80]
+    return results
+
+
+def bench_codec(recipes:RecipeList, repeat:int = 5) -> list:
+    '''times parsing and formatting every step in memory, no file I/O'''
+    steps = [step for recipe in recipes for step in recipe]
+    texts = [step.file_format() for step in steps]
+    count = len(steps) * repeat
+    results = [measure('parse steps', count, lambda: [STEP_CODEC.parse(text)
+                       for _ in range(repeat) for text in texts]),
+               measure('format steps', count, lambda: [step.file_format()
+                       for _ in range(repeat) for step in steps])]
+    for result in results:
+        result['result'] = None
+        print(f"{'':>7} {result['name']:<18} {result['seconds']:9.3f}s "
+              f"{result['files_per_second']:11.0f} steps/s")
+    return results
+
+
+class DictStep():
+    '''a RecipeStep with a per-instance __dict__, as it was before __slots__'''
+    def __init__(self, time=75, pressure=16):
+        self.__dict__.update(STEP_CODEC.defaults)
+        self.time = time
+        self.pressure = pressure
+        self._dirty = True
+
+
+def allocated(factory, count:int) -> int:
+    '''returns the bytes allocated by count calls of factory, kept alive'''
+    tracemalloc.start()
+    objects = [factory(n % 300, n % 16 + 0.5) for n in range(count)]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objects
+    return size
+
+
+def bench_memory(count:int = 100_000) -> list:
+    '''compares bytes per step with and without __slots__'''
+    before = allocated(DictStep, count)
+    after = allocated(RecipeStep, count)
+    print(f"{count} steps with __dict__:  {before / count:6.0f} bytes/step")
+    print(f"{count} steps with __slots__: {after / count:6.0f} bytes/step"
+          f"  ({before / after:.1f}x smaller)")
+    return [{'name': 'bytes per step', 'steps': count,
+             'dict_bytes': before / count, 'slots_bytes': after / count}]
+
+
+def revision() -> str:
+    '''the git revision of the code under test, if there is one'''
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                              capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))
+                              ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results:list, baseline_file:str):
+    '''prints the time of every result relative to a saved baseline run'''
+    with open(baseline_file) as f:
+        baseline = json.load(f)
+    seconds = {(r['name'], r.get('recipes')): r['seconds']
+               for r in baseline['results'] if 'seconds' in r}
+    print(f"\ncompared with {baseline.get('revision')} ({baseline_file}):")
+    for result in results:
+        key = (result['name'], result.get('recipes'))
+        if 'seconds' in result and seconds.get(key):
+            ratio = result['seconds'] / seconds[key]
+            flag = '  SLOWER' if ratio > 1.1 else ''
+            print(f"{key[1] or '':>7} {key[0]:<18} {ratio:6.2f}x{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--recipes', type=int, nargs='+', default=[10, 1000],
+                        help="library sizes to generate (default: 10 1000)")
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--steps', type=int, default=100_000,
+                        help="number of steps for the memory benchmark")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--dir', help="existing Domaille parent directory to "
+                        "read instead of a synthetic tree")
+    parser.add_argument('--json', help="write the results to this file")
+    parser.add_argument('--compare', help="results file of a previous run")
+    args = parser.parse_args()
+
+    results = []
+    if args.dir:
+        files, recipes = count_files(args.dir), count_recipes(args.dir)
+        # a new list for every call, as in suite()
+        read = lambda **kwargs: RecipeList().read(args.dir, **kwargs)
+        for name, count, kwargs in (('read', files, {}),
+                                    (f'read {args.workers} workers', files,
+                                     {'workers': args.workers}),
+                                    ('read lazy', recipes, {'lazy': True})):
+            result = measure(name, count, read, **kwargs)
+            result['result'] = len(result['result'])
+            print(f"{result['name']:<18} {result['seconds']:9.3f}s "
+                  f"{result['files_per_second']:11.0f} files/s")
+            results.append(result)
+        results += bench_codec(RecipeList(args.dir, args.workers))
+    else:
+        for recipes in args.recipes:
+            with tempfile.TemporaryDirectory() as directory:
+                results += suite(directory, recipes, args.workers, args.seed)
+            with tempfile.TemporaryDirectory() as directory:
+                make_tree(directory, min(recipes, 1000), seed=args.seed)
+                results += bench_codec(RecipeList(directory))
+    results += bench_memory(args.steps)
+
+    if args.compare:
+        compare(results, args.compare)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'revision': revision(), 'python': sys.version,
+                       'platform': platform.platform(), 'time': time.time(),
+                       'results': results}, f, indent=2)
+
+
+if __name__=="__main__":
+    main()
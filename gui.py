@@ -1,43 +1,413 @@
-from obj import Recipe, RecipeStep, Settings
-from PyQt6 import QtWidgets, uic
+import time
+STARTED = time.perf_counter()
+
+from obj import Dommaile, Recipe, RecipeStep, Settings
+from PyQt6 import QtCore, QtWidgets, uic
+import logging
+import os
 import sys
+import threading
 
 from ui import Ui_MainWindow
 from step import Ui_Form
 
-settings = Settings.read()
-recipe = Recipe('recipe',3,32,1,RecipeStep(film="Brown 5um"),RecipeStep(),RecipeStep())
-print(len(recipe))
+logger = logging.getLogger(__name__)
+
+FIRST_PAINT_TARGET = 0.5    # seconds from start to the first painted window
+MAX_STEPS = 9
+
+class LibraryLoader(QtCore.QThread):
+    '''reads the settings and then the recipe headers off the GUI thread'''
+    settings_loaded = QtCore.pyqtSignal(object)
+    progress = QtCore.pyqtSignal(int, int)
+    loaded = QtCore.pyqtSignal(object)
+
+    def __init__(self, directory:str, workers:int = 8, parent=None):
+        super().__init__(parent)
+        self.directory = directory
+        self.workers = workers
+        self._cancel = threading.Event()
+        self._reported = 0
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def run(self):
+        settings = Settings.read(self.directory)
+        self.settings_loaded.emit(settings)
+        if self.cancelled:
+            return
+        domaille = Dommaile(path=self.directory, settings=settings)
+        domaille.recipes.read(self.directory, self.workers, lazy=True,
+                              progress=self._progress, cancel=self._cancel)
+        if not self.cancelled:
+            self.loaded.emit(domaille)
+
+    def _progress(self, done:int, total:int):
+        # a signal per percent, not per file
+        if done == total or done * 100 // total > self._reported * 100 // total:
+            self._reported = done
+            self.progress.emit(done, total)
+
+class LibraryBridge(QtCore.QObject):
+    '''delivers LibraryWatcher changes to the GUI thread'''
+    changed = QtCore.pyqtSignal(object)
+
+class StepEditor(QtWidgets.QWidget, Ui_Form):
+    '''editor of one recipe step, the combo boxes share the Settings models'''
+    def __init__(self, films, pads, lubricants, parent=None):
+        super().__init__(parent)
+        self.setupUi(self)
+        self.cbo_film.setModel(films)
+        self.cbo_pad.setModel(pads)
+        self.cbo_lubricant.setModel(lubricants)
+        self.step = None
+
+    def load_step(self, step:RecipeStep):
+        self.step = step
+        self.time.setValue(round(step.time))
+        self.pressure.setValue(step.pressure)
+        self.cbo_film.setCurrentText(step.film)
+        self.cbo_pad.setCurrentText(step.pad)
+        self.cbo_lubricant.setCurrentText(step.lubricant)
+        self.desc1.setText(step.description1)
+        self.desc2.setText(step.description2)
+        self.speed.setValue(round(step.speed))
+        self.speed_ramp.setValue(round(step.speed_ramp))
+        self.pressure_ramp.setValue(round(step.pressure_ramp))
+
+def recipe_name(recipe:Recipe) -> str:
+    '''the file name of a recipe read from disk, else its description'''
+    return recipe._source[0] if recipe._source else recipe.description
+
+class RecipeTableModel(QtCore.QAbstractTableModel):
+    '''table of recipe headers, rows are handed to the view in batches
+       as it scrolls so a large library costs only the rows shown'''
+    COLUMNS = (('Name', recipe_name),
+               ('Description', lambda recipe: recipe.description),
+               ('Steps', lambda recipe: recipe.no_of_steps),
+               ('Quantity', lambda recipe: recipe.quantity),
+               ('Rework Step', lambda recipe: recipe.rework_step))
+    BATCH = 256
+    SortRole = QtCore.Qt.ItemDataRole.UserRole
+
+    def __init__(self, recipes:list, parent=None):
+        super().__init__(parent)
+        self._recipes = list(recipes)
+        self._fetched = 0
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else self._fetched
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def data(self, index, role=QtCore.Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == QtCore.Qt.ItemDataRole.DisplayRole or role == self.SortRole:
+            return self.COLUMNS[index.column()][1](self._recipes[index.row()])
+        return None
+
+    def headerData(self, section, orientation, role=QtCore.Qt.ItemDataRole.DisplayRole):
+        if (orientation == QtCore.Qt.Orientation.Horizontal
+                and role == QtCore.Qt.ItemDataRole.DisplayRole):
+            return self.COLUMNS[section][0]
+        return None
+
+    def canFetchMore(self, parent=QtCore.QModelIndex()):
+        return not parent.isValid() and self._fetched < len(self._recipes)
+
+    def fetchMore(self, parent=QtCore.QModelIndex()):
+        count = min(self.BATCH, len(self._recipes) - self._fetched)
+        if parent.isValid() or count <= 0:
+            return
+        self.beginInsertRows(QtCore.QModelIndex(), self._fetched, self._fetched + count - 1)
+        self._fetched += count
+        self.endInsertRows()
+
+    def fetch_all(self):
+        if self.canFetchMore():
+            self.beginInsertRows(QtCore.QModelIndex(), self._fetched, len(self._recipes) - 1)
+            self._fetched = len(self._recipes)
+            self.endInsertRows()
+
+    def recipe(self, row:int) -> Recipe:
+        return self._recipes[row]
+
+    def apply(self, delta, recipes:list):
+        '''updates the rows named in a Delta from the refreshed recipes'''
+        if not (delta.added or delta.modified or delta.removed):
+            return
+        names = set(delta.added) | set(delta.modified)
+        current = {recipe_name(recipe): recipe for recipe in recipes
+                   if recipe_name(recipe) in names}
+        removed, modified = set(delta.removed), set(delta.modified)
+        last = len(self.COLUMNS) - 1
+        for row in reversed(range(len(self._recipes))):
+            name = recipe_name(self._recipes[row])
+            if name in removed:
+                if row < self._fetched:
+                    self.beginRemoveRows(QtCore.QModelIndex(), row, row)
+                    del self._recipes[row]
+                    self._fetched -= 1
+                    self.endRemoveRows()
+                else:
+                    del self._recipes[row]
+            elif name in modified:
+                self._recipes[row] = current[name]
+                if row < self._fetched:
+                    self.dataChanged.emit(self.index(row, 0), self.index(row, last))
+        added = [current[name] for name in delta.added if name in current]
+        if added and self._fetched == len(self._recipes):
+            # everything was shown, show the new rows too
+            self.beginInsertRows(QtCore.QModelIndex(), self._fetched,
+                                 self._fetched + len(added) - 1)
+            self._recipes.extend(added)
+            self._fetched += len(added)
+            self.endInsertRows()
+        else:
+            self._recipes.extend(added)
 
 class MainWindow(QtWidgets.QMainWindow, Ui_MainWindow):
     def __init__(self, *args, obj=None, **kwargs):
         super().__init__(*args, **kwargs)
         self.setupUi(self)
+        self.painted = None     # seconds from start to the first paint
+        # the designer's three step tabs are replaced by StepEditors built
+        # when a tab is first shown and kept for the next recipe
+        self.tabWidget.clear()
+        for page in (self.step_1, self.step_2, self.step_3):
+            page.deleteLater()
+        self.no_of_steps.setMaximum(MAX_STEPS)
+        self.films = QtCore.QStringListModel(self)
+        self.pads = QtCore.QStringListModel(self)
+        self.lubricants = QtCore.QStringListModel(self)
+        self.step_pages = []
+        self.step_editors = {}  # page index: StepEditor
+        self.tabWidget.currentChanged.connect(self.step_shown)
+        self.domaille = self.watcher = self.loader = None
+        self.loading = QtWidgets.QProgressBar()
+        self.loading.setMaximumWidth(200)
+        self.loading.setFormat('Loading recipes %v/%m')
+        self.cancel_loading = QtWidgets.QPushButton('Cancel')
+        self.cancel_loading.clicked.connect(self.library_cancelled)
+        self.statusBar().addPermanentWidget(self.loading)
+        self.statusBar().addPermanentWidget(self.cancel_loading)
+
+        self.browse_recipes([])
+        self.load_recipe(Recipe('recipe',3,32,1,RecipeStep(film="Brown 5um"),
+                                RecipeStep(),RecipeStep()))
+        self.open_library(os.getcwd())
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if self.painted is None:
+            self.painted = time.perf_counter() - STARTED
+            log = logger.warning if self.painted > FIRST_PAINT_TARGET else logger.info
+            log(f"First paint after {self.painted*1000:.0f}ms "
+                f"(target {FIRST_PAINT_TARGET*1000:.0f}ms)")
+
+    def open_library(self, directory:str):
+        '''reads the library in the background, the window fills in as the
+           settings and then the recipes arrive'''
+        if self.loader is not None:
+            self.loader.cancel()
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+        self.centralwidget.setEnabled(False)
+        self.loading.setRange(0, 0)
+        self.loading.show()
+        self.cancel_loading.show()
+        self.statusBar().showMessage(f'Loading {directory}')
+
+        self.loader = LibraryLoader(directory, parent=self)
+        self.loader.settings_loaded.connect(self.settings_loaded)
+        self.loader.progress.connect(self.library_progress)
+        self.loader.loaded.connect(self.library_loaded)
+        self.loader.finished.connect(self.loading_finished)
+        self.loader.start()
+
+    def settings_loaded(self, settings:Settings):
+        if self.sender() is not self.loader:
+            return
+        if settings:
+            self.load_settings(settings)
+            self.load_recipe(self.recipe)
+        self.centralwidget.setEnabled(True)
+
+    def library_progress(self, done:int, total:int):
+        self.loading.setRange(0, total)
+        self.loading.setValue(done)
+
+    def library_loaded(self, domaille:Dommaile):
+        if self.sender() is not self.loader:
+            return
+        # only the headers were read, steps are read when a recipe is selected
+        self.domaille = domaille
+        self.show_recipes(domaille.recipes)
+        # the watcher calls back from its own thread, the queued signal
+        # applies the change between events
+        self.bridge = LibraryBridge(self)
+        self.bridge.changed.connect(self.library_changed)
+        self.watcher = self.domaille.watch(self.bridge.changed.emit)
+        self.statusBar().showMessage(f'{len(domaille.recipes)} recipes', 5000)
+
+    def library_cancelled(self):
+        self.loader.cancel()
+        self.statusBar().showMessage('Loading cancelled', 5000)
+
+    def loading_finished(self):
+        if self.sender() is not self.loader:
+            return
+        self.centralwidget.setEnabled(True)
+        self.loading.hide()
+        self.cancel_loading.hide()
 
-        self.load_settings(settings)
-        self.load_recipe(recipe)
+    def browse_recipes(self, recipes:list):
+        self.model = RecipeTableModel(recipes, self)
+        self.proxy = QtCore.QSortFilterProxyModel(self)
+        self.proxy.setSourceModel(self.model)
+        self.proxy.setSortRole(RecipeTableModel.SortRole)
+        self.proxy.setFilterKeyColumn(-1)
+        self.proxy.setFilterCaseSensitivity(QtCore.Qt.CaseSensitivity.CaseInsensitive)
+
+        self.recipe_filter = QtWidgets.QLineEdit()
+        self.recipe_filter.setPlaceholderText('Filter recipes')
+        self.recipe_filter.setClearButtonEnabled(True)
+        self.recipe_filter.textChanged.connect(self.filter_recipes)
+        self.recipe_view = QtWidgets.QTableView()
+        self.recipe_view.setModel(self.proxy)
+        self.recipe_view.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectionBehavior.SelectRows)
+        self.recipe_view.setSelectionMode(QtWidgets.QAbstractItemView.SelectionMode.SingleSelection)
+        self.recipe_view.setEditTriggers(QtWidgets.QAbstractItemView.EditTrigger.NoEditTriggers)
+        # fixed row heights keep scrolling from measuring every row
+        rows = self.recipe_view.verticalHeader()
+        rows.setSectionResizeMode(QtWidgets.QHeaderView.ResizeMode.Fixed)
+        rows.setDefaultSectionSize(self.recipe_view.fontMetrics().height() + 6)
+        rows.hide()
+        # the library is read in name order, the proxy only sorts once asked
+        # to and then needs every row
+        columns = self.recipe_view.horizontalHeader()
+        columns.setStretchLastSection(True)
+        columns.setSortIndicator(-1, QtCore.Qt.SortOrder.AscendingOrder)
+        self.recipe_view.setSortingEnabled(True)
+        columns.sortIndicatorChanged.connect(self.model.fetch_all)
+        self.recipe_view.selectionModel().currentRowChanged.connect(self.recipe_selected)
+
+        browser = QtWidgets.QWidget()
+        layout = QtWidgets.QVBoxLayout(browser)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.recipe_filter)
+        layout.addWidget(self.recipe_view)
+        self.recipe_dock = QtWidgets.QDockWidget('Recipes', self)
+        self.recipe_dock.setObjectName('recipe_dock')
+        self.recipe_dock.setWidget(browser)
+        self.addDockWidget(QtCore.Qt.DockWidgetArea.LeftDockWidgetArea, self.recipe_dock)
+
+    def show_recipes(self, recipes:list):
+        self.recipe_view.horizontalHeader().sortIndicatorChanged.disconnect(self.model.fetch_all)
+        self.model = RecipeTableModel(recipes, self)
+        self.proxy.setSourceModel(self.model)
+        self.recipe_view.horizontalHeader().sortIndicatorChanged.connect(self.model.fetch_all)
+        if self.proxy.sortColumn() >= 0:
+            self.model.fetch_all()
+        else:
+            self.model.fetchMore()
+
+    def filter_recipes(self, text:str):
+        if text:
+            # the proxy only filters rows the model has handed out
+            self.model.fetch_all()
+        self.proxy.setFilterFixedString(text)
+
+    def recipe_selected(self, current, previous):
+        if not current.isValid():
+            return
+        # keep only the selected recipe's steps in memory
+        self.recipe.unload()
+        self.load_recipe(self.model.recipe(self.proxy.mapToSource(current).row()))
+
+    def library_changed(self, change):
+        delta = self.domaille.recipes.apply(change)
+        self.model.apply(delta, self.domaille.recipes)
+        if delta.conflicts:
+            self.statusBar().showMessage(
+                f"Changed on disk, keeping unsaved edits: {', '.join(delta.conflicts)}")
+        if change.settings:
+            settings = Settings.read(self.domaille.path)
+            if settings:
+                self.load_settings(settings)
+                self.load_recipe(self.recipe)
+        name = self.recipe._source[0] if self.recipe._source else None
+        if name in delta.modified:
+            self.load_recipe(next(recipe for recipe in self.domaille.recipes
+                                  if recipe._source and recipe._source[0] == name))
+
+    def closeEvent(self, event):
+        if self.loader is not None:
+            self.loader.cancel()
+            self.loader.wait()
+        if self.watcher is not None:
+            self.watcher.stop()
+        super().closeEvent(event)
         
     def load_settings(self, settings:Settings):
-        self.cbo_film.addItems(settings.film)
-        self.cbo_film_2.addItems(settings.film)
-        self.cbo_film_3.addItems(settings.film)
-        self.cbo_pad.addItems(settings.pad)
-        self.cbo_pad_2.addItems(settings.pad)
-        self.cbo_pad_3.addItems(settings.pad)
-        self.cbo_lubricant.addItems(settings.lubricant)
-        self.cbo_lubricant_2.addItems(settings.lubricant)
-        self.cbo_lubricant_3.addItems(settings.lubricant)
+        # every step editor's combo boxes follow these models
+        self.films.setStringList(settings.film)
+        self.pads.setStringList(settings.pad)
+        self.lubricants.setStringList(settings.lubricant)
 
     def load_recipe(self, recipe:Recipe):
+        self.recipe = recipe
         self.description.setText(recipe.description)
         self.no_of_steps.setValue(recipe.no_of_steps)
         self.quantity.setValue(recipe.quantity)
         self.rework_step.setValue(recipe.rework_step)
-        self.cbo_film.setCurrentText(recipe[1].film)
-        print(f"{recipe[3].film} == {self.cbo_film.currentText()} ? ")
-        self.cbo_film_2.setCurrentText(recipe[2].film)
-        self.cbo_film_3.setCurrentText(recipe[3].film)
-        
+        self.show_steps(min(recipe.no_of_steps, MAX_STEPS))
+
+    def show_steps(self, count:int):
+        '''shows count step tabs, their editors are loaded when shown'''
+        self.tabWidget.blockSignals(True)
+        while len(self.step_pages) < count:
+            page = QtWidgets.QWidget()
+            QtWidgets.QVBoxLayout(page).setContentsMargins(0, 0, 0, 0)
+            self.step_pages.append(page)
+        while self.tabWidget.count() > count:
+            self.tabWidget.removeTab(self.tabWidget.count() - 1)
+        while self.tabWidget.count() < count:
+            number = self.tabWidget.count() + 1
+            self.tabWidget.addTab(self.step_pages[number - 1], f"Step {number}")
+        self.tabWidget.blockSignals(False)
+        for editor in self.step_editors.values():
+            editor.step = None
+        self.step_shown(self.tabWidget.currentIndex())
+
+    def step_shown(self, index:int):
+        if index < 0:
+            return
+        editor = self.step_editors.get(index)
+        if editor is None:
+            editor = StepEditor(self.films, self.pads, self.lubricants)
+            self.step_pages[index].layout().addWidget(editor)
+            self.step_editors[index] = editor
+        try:
+            step = self.recipe[index + 1]
+        except (OSError, ValueError) as e:
+            # a lazy recipe reads its step files here, one may be missing
+            editor.step = None
+            editor.setEnabled(False)
+            self.statusBar().showMessage(
+                f"Cannot read the steps of {recipe_name(self.recipe)}: {e}")
+            return
+        editor.setEnabled(True)
+        if editor.step is not step:
+            editor.load_step(step if step is not None else RecipeStep())
 
 
 app = QtWidgets.QApplication(sys.argv)
@@ -1,4 +1,229 @@
+import abc
+import asyncio
+import bisect
+import fnmatch
+import ctypes
+import ctypes.util
+import hashlib
+import itertools
+import json
+import logging
+import mmap
 import os   # for file operations
+import select
+import shlex
+import shutil
+import sqlite3
+import struct
+import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from operator import attrgetter, itemgetter
+
+logger = logging.getLogger(__name__)
+
+
+class IOStats():
+    """Counts and times the file I/O of the recipe library.
+    
+    Instrumentation is process wide and off by default; while it is off
+    each file operation only pays for one ``is not None`` check. Counters
+    are updated under a lock so threaded reads are counted correctly.
+    The optional hook is called as ``hook(event, path, nbytes, seconds)``
+    with event one of 'read', 'write', 'scan' or 'recipe'.
+    
+    Usage:
+        >>> stats = Dommaile.enable_stats()
+        >>> Dommaile().read("E:/")
+        >>> stats
+        <IOStats(opens=4001, read=312.0kB, written=0.0kB, scans=2, recipes=1000)>
+        >>> Dommaile.disable_stats()
+    """
+    def __init__(self, hook=None):
+        self.hook = hook
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        '''zeroes every counter'''
+        with self._lock:
+            self.opens = 0
+            self.bytes_read = 0
+            self.bytes_written = 0
+            self.scans = 0
+            self.scanned_entries = 0
+            self.recipes = 0
+            self.recipe_seconds = 0.0
+
+    def __repr__(self):
+        return (f"<IOStats(opens={self.opens}, read={self.bytes_read/1000:.1f}kB, "
+                f"written={self.bytes_written/1000:.1f}kB, scans={self.scans}, "
+                f"recipes={self.recipes})>")
+
+    def as_dict(self) -> dict:
+        return {'opens': self.opens, 'bytes_read': self.bytes_read,
+                'bytes_written': self.bytes_written, 'scans': self.scans,
+                'scanned_entries': self.scanned_entries, 'recipes': self.recipes,
+                'recipe_seconds': self.recipe_seconds}
+
+    def _read(self, path:str, nbytes:int, seconds:float):
+        with self._lock:
+            self.opens += 1
+            self.bytes_read += nbytes
+        if self.hook:
+            self.hook('read', path, nbytes, seconds)
+
+    def _write(self, path:str, nbytes:int, seconds:float):
+        with self._lock:
+            self.opens += 1
+            self.bytes_written += nbytes
+        if self.hook:
+            self.hook('write', path, nbytes, seconds)
+
+    def _scan(self, path:str, entries:int, seconds:float):
+        with self._lock:
+            self.scans += 1
+            self.scanned_entries += entries
+        if self.hook:
+            self.hook('scan', path, entries, seconds)
+
+    def _recipe(self, name:str, seconds:float):
+        with self._lock:
+            self.recipes += 1
+            self.recipe_seconds += seconds
+        if self.hook:
+            self.hook('recipe', name, 0, seconds)
+
+
+_stats = None   # the active IOStats, None when instrumentation is off
+
+
+class FileCache():
+    """Process-wide LRU cache of parsed recipe and step files.
+    
+    Entries are keyed by (path, mtime_ns, size): a file is re-read as soon
+    as it changes on disk, at the cost of one os.stat per lookup. The
+    least recently used entries are evicted once there are more than
+    max_entries or the cached files add up to more than max_bytes.
+    Off by default, see Dommaile.enable_cache.
+    
+    Usage:
+        >>> cache = Dommaile.enable_cache(max_entries=50_000)
+        >>> Recipe.read("MyRecipe", "E:/")  # parsed from disk
+        >>> Recipe.read("MyRecipe", "E:/")  # from the cache
+        >>> cache
+        <FileCache(entries=4, 24.0kB, hits=4, misses=4, evictions=0)>
+        >>> cache.invalidate("E:/")  # everything under E:/
+    """
+    def __init__(self, max_entries:int = 20_000, max_bytes:int = 32_000_000):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()    # path: (mtime_ns, size, value)
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = self.misses = self.evictions = 0
+
+    def __repr__(self):
+        return (f"<FileCache(entries={len(self)}, {self.bytes/1000:.1f}kB, "
+                f"hits={self.hits}, misses={self.misses}, evictions={self.evictions})>")
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, file:str, parse):
+        '''returns parse(text of file), parsing only when the file is not
+           cached or changed since it was'''
+        stat = os.stat(file)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self._entries.get(file)
+            if entry is not None and entry[:2] == stamp:
+                self._entries.move_to_end(file)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+
+        value = parse(_read_text(file))
+        with self._lock:
+            old = self._entries.pop(file, None)
+            if old is not None:
+                self.bytes -= old[1]
+            self._entries[file] = (*stamp, value)
+            self.bytes += stat.st_size
+            while self._entries and (len(self._entries) > self.max_entries
+                                     or self.bytes > self.max_bytes):
+                _, (_, size, _) = self._entries.popitem(last=False)
+                self.bytes -= size
+                self.evictions += 1
+        return value
+
+    def invalidate(self, path:str = None):
+        '''forgets one file, every file under a directory, or everything'''
+        if path is not None and (path in self._entries or os.path.isfile(path)):
+            self.discard(path)
+            return
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+                self.bytes = 0
+                return
+            prefix = path.rstrip(os.sep) + os.sep
+            for file in [file for file in self._entries
+                         if file == path or file.startswith(prefix)]:
+                self.bytes -= self._entries.pop(file)[1]
+
+    def discard(self, file:str):
+        '''forgets one file, if it is cached'''
+        with self._lock:
+            entry = self._entries.pop(file, None)
+            if entry is not None:
+                self.bytes -= entry[1]
+
+    def reset_stats(self):
+        self.hits = self.misses = self.evictions = 0
+
+
+_file_cache = None  # the active FileCache, None when caching is off
+
+
+def _read_parsed(file:str, parse):
+    '''returns parse(text of file), through the FileCache if it is on'''
+    cache = _file_cache
+    if cache is None:
+        return parse(_read_text(file))
+    return cache.get(file, parse)
+
+
+def _read_text(file:str) -> str:
+    '''returns the contents of an ascii file'''
+    if _stats is None:
+        with open(file, 'r', encoding='ascii') as f:
+            return f.read()
+    start = time.perf_counter()
+    with open(file, 'r', encoding='ascii') as f:
+        text = f.read()
+    _stats._read(file, len(text), time.perf_counter() - start)
+    return text
+
+
+def _write_text(file:str, text:str):
+    '''replaces the contents of a file'''
+    if _file_cache is not None:
+        # FAT keeps 2s mtimes, same-size rewrites would look unchanged
+        _file_cache.discard(file)
+    if _stats is None:
+        with open(file, 'w') as f:
+            f.write(text)
+        return
+    start = time.perf_counter()
+    with open(file, 'w') as f:
+        f.write(text)
+    _stats._write(file, len(text), time.perf_counter() - start)
+
 
 class Dommaile():
     """Manages polishing system settings, recipes and file operations.
@@ -13,6 +238,7 @@ class Dommaile():
         >>> domaille.recipes.append(recipe)  # Add recipe
         >>> domaille.write()  # Save everything to disk
     """
+    SYNC_STAGING = '.sync'  # under the target Domaille folder, see sync
     
     def __init__(self, *args, path:'Path' = None, settings:'Settings' = None, 
                  recipes:'RecipeList' = None):
@@ -31,15 +257,14 @@ class Dommaile():
 
         
         if isinstance(path, Path):
-            print(' Dommaile.__init__(path:Path)')
+            logger.debug('Dommaile.__init__(path:Path)')
             self._path = path
         elif isinstance(path, str): 
-            print(' Dommaile.__init__(path:str)')
+            logger.debug('Dommaile.__init__(path:str)')
             self._path = Path(path)
         else:
-            print("Path must be a string or Path object")
-            print(f"type(path): {type(path)}")
-            print(f"path: {path}")
+            logger.error(f"Path must be a string or Path object, "
+                         f"not {type(path)}: {path}")
         
         if not settings:
             self._settings = Settings.default()
@@ -70,13 +295,13 @@ class Dommaile():
         domaille_dir = f"{directory}{os.sep}Domaille"
         steps_dir = f"{domaille_dir}{os.sep}Processes{os.sep}Steps"
         if not os.path.isdir(directory):
-            print(f"Invalid directory: {directory}")
+            logger.error(f"Invalid directory: {directory}")
             return self._path
         if not os.path.isdir(steps_dir):
             try:
                 os.makedirs(steps_dir, exist_ok=True)
             except OSError as e:
-                print(f"Error creating directories: {e}")
+                logger.error(f"Error creating directories: {e}")
                 return None
     
         self._path = Path(directory)
@@ -101,7 +326,7 @@ class Dommaile():
                 path = parts[0].rstrip(os.sep)
             self._path = path
         else:
-            print(f"Invalid path: {path}")
+            logger.error(f"Invalid path: {path}")
             self._path = None
     
             
@@ -150,62 +375,400 @@ class Dommaile():
         self._recipes = recipes
         return recipes  
 
-    def write(self, path:'Path' = None):
-        '''writes the Domaille object to the specified path'''
+    def write(self, path:'Path' = None, force:bool = False,
+              validate:bool = False):
+        '''writes the Domaille object to the specified path, only the
+           recipes that changed unless force is True. With validate the
+           recipes to write are checked against the settings first, see
+           RecipeList.validate, and nothing is written if any fail'''
         if not path:
             path = self.path
             self.path = Path(path)
-        self.path.write(path)
+        if validate:
+            report = self.recipes.validate(
+                self.settings, self.recipes._unwritten(path, force))
+            if not report:
+                raise ValidationError(report)
+        Path.write(path)
         self.settings.write(path)
-        self.recipes.write(path)
+        self.recipes.write(path, force)
 
-    def read(self, directory:'Path' = None):
-        '''reads the Domaille directory contents'''
+    def read(self, directory:'Path' = None, workers:int = None,
+             lazy:bool = False, index:bool = False, intern:bool = False,
+             progress=None, cancel:threading.Event = None):
+        '''reads the Domaille directory contents
+        
+        workers sets the number of threads used to load recipes, lazy
+        reads only the recipe headers, index takes unchanged recipes from
+        the LibraryIndex, intern shares identical steps between recipes
+        and progress(done, total) and cancel report on and stop the
+        recipe reads, see RecipeList.read. Files that failed to load are
+        in recipes.errors
+        '''
         if not directory:
             directory = self.path      
         if not os.path.isdir(directory):
-            print(f"Invalid directory: {directory}")
+            logger.error(f"Invalid directory: {directory}")
             return None
         self.path = Path.read(directory)
         self.settings = Settings.read(directory)
-        # Initialize RecipeList with directory path
-        self._recipes = RecipeList(directory)
+        self._recipes = RecipeList().read(directory, workers, lazy, index, intern,
+                                          progress, cancel)
+        return self
+
+    async def read_async(self, directory:'Path' = None, limit:int = 16,
+                         lazy:bool = False, index:bool = False,
+                         intern:bool = False):
+        '''coroutine version of read, reads up to limit files at once in
+           worker threads without blocking the event loop'''
+        if not directory:
+            directory = self.path
+        loop = asyncio.get_running_loop()
+        if not await loop.run_in_executor(None, os.path.isdir, directory):
+            logger.error(f"Invalid directory: {directory}")
+            return None
+        self.path = await loop.run_in_executor(None, Path.read, directory)
+        settings, recipes = await asyncio.gather(
+            loop.run_in_executor(None, Settings.read, directory),
+            RecipeList().read_async(directory, limit, lazy, index, intern))
+        self.settings = settings
+        self._recipes = recipes
         return self
+
+    async def write_async(self, path:'Path' = None, force:bool = False,
+                          limit:int = 16):
+        '''coroutine version of write, writes up to limit recipes at once
+           in worker threads without blocking the event loop'''
+        if not path:
+            path = self.path
+            self.path = Path(path)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, Path.write, path)
+        await asyncio.gather(loop.run_in_executor(None, self.settings.write, path),
+                             self.recipes.write_async(path, force, limit))
             
+    def refresh(self) -> 'Delta':
+        '''re-reads only the recipes that changed on disk since the last
+           read, returns the names of the added, modified and removed
+           recipes and of the unsaved ones that changed on disk. See
+           RecipeList.refresh'''
+        if self.recipes._directory is not None:
+            return self.recipes.refresh()
+        return self.recipes.refresh(self.path)
+
+    def write_snapshot(self, file:str) -> int:
+        '''saves settings and recipes to one binary file, see Snapshot'''
+        return Snapshot.save(self, file)
+
     @staticmethod
-    def wipe(directory:str) -> bool:
-        ''' wipes the Domaille directory and all contents
-            returns True if successful, False if failed
-        '''
-        if not os.path.isdir(directory):
-            print(f"Invalid directory: {directory}")
-            return False
+    def read_snapshot(file:str, use_mmap:bool = False,
+                      intern:bool = False) -> 'Dommaile':
+        '''loads a Dommaile saved by write_snapshot, see Snapshot'''
+        return Snapshot.load(file, use_mmap, intern)
+
+    @staticmethod
+    def load(storage:'Storage') -> 'Dommaile':
+        '''reads the library kept in a storage backend, see Storage'''
+        return storage.read()
+
+    def save(self, storage:'Storage', force:bool = False) -> int:
+        '''writes settings and changed recipes, every recipe with force,
+           to a storage backend, returns the number of recipes written'''
+        return storage.write(self, force)
+
+    def iter_recipes(self, pattern:str = None, lazy:bool = False,
+                     directory:'Path' = None):
+        '''yields the recipes on disk one at a time without loading the
+           library, optionally only the names matching pattern or only
+           their headers, see RecipeList.stream'''
+        return RecipeList.stream(directory or self.path, pattern, lazy)
+
+    def watch(self, callback, debounce:float = 0.25, interval:float = 2.0,
+              polling:bool = False) -> 'LibraryWatcher':
+        '''starts a LibraryWatcher calling callback(LibraryChange) from its
+           own thread whenever recipes or Settings.txt change on disk'''
+        return LibraryWatcher(self.path, callback, debounce, interval, polling)
+
+    def sync(self, target:str, workers:int = 8, checksum:bool = False,
+             verify:bool = True) -> 'SyncResult':
+        """Make target/Domaille an exact copy of this Domaille folder.
+        
+        Only files that are missing or differ on the target are copied,
+        in parallel, and target files that no longer exist here are
+        deleted. The recipe index is not copied. Each file is copied into
+        Domaille/.sync first, outside Processes where the polisher looks
+        for recipes, and renamed into place once complete, so an
+        interrupted sync never leaves a half-written recipe behind.
+        Running it again clears .sync and resumes where it stopped.
         
-        if directory.endswith('Domaille'):
-            directory = directory.rstrip('Domaille').rstrip(os.sep)
+        Args:
+            target (str): Parent directory of the target Domaille folder,
+                e.g. the flash drive
+            workers (int): Number of files copied at once
+            checksum (bool): Compare files with the same size by content
+                instead of by modification time. Without it files whose
+                times differ by FAT's 2 seconds or less are still hashed
+            verify (bool): Checksum every copied file against its source
+            
+        Returns:
+            SyncResult: copied and deleted paths relative to Domaille, the
+                number of unchanged files and (path, exception) errors
+            
+        Raises:
+            ValueError: This path has no Domaille/Processes folder, or it
+                is empty while the target is not; the target is left
+                untouched rather than wiped
+            
+        Usage:
+            >>> domaille.sync("E:/")
+            SyncResult(copied=['Processes/new', ...], deleted=[], unchanged=4120, errors=[])
+        """
+        source_dir = f"{self.path}{os.sep}Domaille"
+        target_dir = f"{target}{os.sep}Domaille"
+        if not os.path.isdir(f"{source_dir}{os.sep}Processes"):
+            raise ValueError(f"No Domaille library to sync in {self.path}")
+        staging = f"{target_dir}{os.sep}{Dommaile.SYNC_STAGING}"
+        # copies an interrupted sync left behind
+        shutil.rmtree(staging, ignore_errors=True)
+        source = {name: stat for name, stat in _tree_files(source_dir).items()
+                  if not name.startswith(f"{Dommaile.SYNC_STAGING}{os.sep}")}
+        source.pop(LibraryIndex.FILENAME, None)
+        existing = _tree_files(target_dir)
+        if not source and existing:
+            raise ValueError(f"Refusing to sync the empty library in {self.path} "
+                             f"over {target_dir}")
+        os.makedirs(target_dir, exist_ok=True)
+
+        def same(name):
+            src, dst = source[name], existing.get(name)
+            if dst is None or src.st_size != dst.st_size:
+                return False
+            if not checksum and src.st_mtime_ns == dst.st_mtime_ns:
+                return True
+            # FAT stores modification times in 2 second steps, so a close
+            # mtime may be the same file or an edit made right after a sync
+            if checksum or abs(src.st_mtime - dst.st_mtime) <= 2:
+                return (_file_hash(f"{source_dir}{os.sep}{name}")
+                        == _file_hash(f"{target_dir}{os.sep}{name}"))
+            return False
+
+        def copy(name):
+            src = f"{source_dir}{os.sep}{name}"
+            dst = f"{target_dir}{os.sep}{name}"
+            part = f"{staging}{os.sep}{name}"
+            try:
+                os.makedirs(os.path.dirname(part), exist_ok=True)
+                os.makedirs(os.path.dirname(dst), exist_ok=True)
+                shutil.copyfile(src, part)
+                shutil.copystat(src, part)
+                if verify and _file_hash(src) != _file_hash(part):
+                    os.remove(part)
+                    raise OSError(f"checksum mismatch after copy: {dst}")
+                os.replace(part, dst)
+            except Exception as e:
+                return e
+
+        def delete(name):
+            try:
+                os.remove(f"{target_dir}{os.sep}{name}")
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            names = sorted(source)
+            changed = [name for name, equal in zip(names, pool.map(same, names))
+                       if not equal]
+            stale = sorted(existing.keys() - source.keys())
+            copy_errors = list(pool.map(copy, changed))
+            delete_errors = list(pool.map(delete, stale))
+        shutil.rmtree(staging, ignore_errors=True)
 
-        if not os.path.isdir(f"{directory}{os.sep}Domaille"):
-            print(f"Domaille directory not found: {directory}")
-            return True # nothing to delete
+        result = SyncResult([], [], len(source) - len(changed), [])
+        for names, errors, done in ((changed, copy_errors, result.copied),
+                                    (stale, delete_errors, result.deleted)):
+            for name, error in zip(names, errors):
+                if error is None:
+                    done.append(name.replace(os.sep, '/'))
+                else:
+                    logger.error(f"Error syncing {name}: {error}")
+                    result.errors.append((name.replace(os.sep, '/'), error))
+        logger.info(f"Synced {target_dir}: {len(result.copied)} copied, "
+                    f"{len(result.deleted)} deleted, {result.unchanged} unchanged")
+        return result
+
+    @staticmethod
+    def enable_stats(hook=None) -> 'IOStats':
+        '''starts counting file I/O process wide, returns the IOStats'''
+        global _stats
+        _stats = IOStats(hook)
+        return _stats
+
+    @staticmethod
+    def disable_stats() -> 'IOStats':
+        '''stops counting file I/O, returns the final IOStats if any'''
+        global _stats
+        stats, _stats = _stats, None
+        return stats
+
+    @staticmethod
+    def enable_cache(max_entries:int = 20_000, max_bytes:int = 32_000_000) -> 'FileCache':
+        '''starts caching parsed recipe and step files process wide,
+           returns the FileCache'''
+        global _file_cache
+        _file_cache = FileCache(max_entries, max_bytes)
+        return _file_cache
+
+    @staticmethod
+    def disable_cache() -> 'FileCache':
+        '''stops caching parsed files, returns the FileCache if any'''
+        global _file_cache
+        cache, _file_cache = _file_cache, None
+        return cache
+
+    @staticmethod
+    def wipe(directory:str, workers:int = 8, dry_run:bool = False,
+             background:bool = False) -> 'WipeResult':
+        """Delete the Domaille directory and all its contents.
         
+        Args:
+            directory (str): Parent of the Domaille directory, or the
+                Domaille directory itself
+            workers (int): Number of files deleted at once
+            dry_run (bool): Only count what would be deleted
+            background (bool): Rename Domaille out of the way and delete it
+                in a background thread, so the call returns at once. The
+                result counts nothing yet; its thread has the final
+                WipeResult as thread.result once joined. Domaille.deleting-*
+                trees an earlier background wipe left behind are deleted
+                too
+            
+        Returns:
+            WipeResult: Files, directories and bytes deleted (or that
+                would be), (path, exception) errors and the background
+                thread. It is falsy if anything failed
+            
+        Usage:
+            >>> Dommaile.wipe("E:/", dry_run=True)
+            WipeResult(files=4121, dirs=3, bytes=1783310, errors=[], thread=None)
+            >>> Dommaile.wipe("E:/", background=True).thread.join()
+        """
+        if os.path.basename(os.path.normpath(directory)) == 'Domaille':
+            directory = os.path.dirname(os.path.normpath(directory))
+        if not os.path.isdir(directory):
+            logger.error(f"Invalid directory: {directory}")
+            return WipeResult(0, 0, 0, [(directory, NotADirectoryError(directory))], None)
+
+        domaille_path = f"{directory}{os.sep}Domaille"
+        # trees renamed by a background wipe that did not get to finish
+        with os.scandir(directory) as entries:
+            roots = sorted(entry.path for entry in entries
+                           if entry.name.startswith('Domaille.deleting-')
+                           and entry.is_dir(follow_symlinks=False))
+        if os.path.isdir(domaille_path):
+            roots.insert(0, domaille_path)
+        elif not roots:
+            logger.info(f"Domaille directory not found: {directory}")
+            return WipeResult(0, 0, 0, [], None)  # nothing to delete
+
+        if background and not dry_run:
+            if roots[0] == domaille_path:
+                trash = f"{domaille_path}.deleting-{time.time_ns()}"
+                try:
+                    os.rename(domaille_path, trash)
+                except OSError as e:
+                    logger.error(f"Error renaming {domaille_path}: {e}")
+                    return WipeResult(0, 0, 0, [(domaille_path, e)], None)
+                roots[0] = trash
+
+            def delete():
+                thread.result = _remove_trees(roots, workers)
+            # not a daemon: the interpreter waits for it rather than
+            # leaving a half-deleted tree behind
+            thread = threading.Thread(target=delete, name='Dommaile.wipe')
+            thread.result = None
+            thread.start()
+            return WipeResult(0, 0, 0, [], thread)
+
+        return _remove_trees(roots, workers, dry_run)
+
+def _tree_files(root:str) -> dict:
+    '''returns {path relative to root: stat} for every file under root'''
+    files = {}
+    if not os.path.isdir(root):
+        return files
+    folders = ['']
+    while folders:
+        folder = folders.pop()
+        with os.scandir(f"{root}{os.sep}{folder}" if folder else root) as entries:
+            for entry in entries:
+                name = f"{folder}{os.sep}{entry.name}" if folder else entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    folders.append(name)
+                elif entry.is_file():
+                    files[name] = entry.stat()
+    return files
+
+
+def _remove_tree(root:str, workers:int = 8, dry_run:bool = False) -> 'WipeResult':
+    '''deletes root and everything under it, files in parallel'''
+    files, dirs, folders = [], [root], [root]
+    while folders:
+        with os.scandir(folders.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.append(entry.path)
+                    folders.append(entry.path)
+                else:
+                    files.append((entry.path, entry.stat(follow_symlinks=False).st_size))
+    if dry_run:
+        return WipeResult(len(files), len(dirs),
+                          sum(nbytes for _, nbytes in files), [], None)
+
+    def remove(file):
         try:
-            domaille_path = f"{directory}{os.sep}Domaille"
-            for root, dirs, files in os.walk(domaille_path, topdown=False):
-                for name in files:
-                    try:
-                        os.remove(os.path.join(root, name))
-                    except Exception as e:
-                        print(f"Error deleting file: {e}")
-                for name in dirs:
-                    try:
-                        os.rmdir(os.path.join(root, name))
-                    except Exception as e:
-                        print(f"Error deleting directory: {e}")
-                os.rmdir(domaille_path)
-            return True
+            os.remove(file)
+        except FileNotFoundError:
+            pass
         except Exception as e:
-            print(f"Error deleting directory: {e}")
-            return False
+            return e
+
+    paths = [file for file, _ in files]
+    if workers and workers > 1 and len(paths) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(remove, paths))
+    else:
+        results = [remove(file) for file in paths]
+    errors = [(file, e) for file, e in zip(paths, results) if e is not None]
+
+    # deepest directories first, they are empty by now
+    for folder in sorted(dirs, key=lambda folder: folder.count(os.sep), reverse=True):
+        try:
+            os.rmdir(folder)
+        except Exception as e:
+            errors.append((folder, e))
+    for path, e in errors:
+        logger.error(f"Error deleting {path}: {e}")
+    failed = {path for path, _ in errors}
+    return WipeResult(sum(1 for file, _ in files if file not in failed),
+                      sum(1 for folder in dirs if folder not in failed),
+                      sum(nbytes for file, nbytes in files if file not in failed),
+                      errors, None)
+
+def _remove_trees(roots:list, workers:int = 8, dry_run:bool = False) -> 'WipeResult':
+    '''deletes every root with _remove_tree, returns the combined result'''
+    results = [_remove_tree(root, workers, dry_run) for root in roots]
+    return WipeResult(sum(result.files for result in results),
+                      sum(result.dirs for result in results),
+                      sum(result.bytes for result in results),
+                      [error for result in results for error in result.errors], None)
+
+def _file_hash(file:str) -> bytes:
+    '''returns the SHA-256 digest of a file'''
+    digest = hashlib.sha256()
+    with open(file, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            digest.update(block)
+    return digest.digest()
 
 
 class Path(str):
@@ -226,7 +789,7 @@ class Path(str):
         elif os.path.isdir(path):
             self._path = path
         else:
-            print(f"Invalid Path in Path init: {path}")
+            logger.error(f"Invalid Path in Path init: {path}")
             self._path = os.getcwd()
 
     def __str__(self):
@@ -239,22 +802,24 @@ class Path(str):
             self._path = path
 
         else:
-            print(f"Invalid path in Path setter: {path}")
+            logger.error(f"Invalid path in Path setter: {path}")
             self._path = os.getcwd()
 
     # getter:
     def __get__(self):
         return self._path
     
-    def write(self, path:str):
+    @staticmethod
+    def write(path:str):
         try:
             os.makedirs(f"{path}{os.sep}Domaille{os.sep}Processes{os.sep}Steps", exist_ok=True)
             return True
         except Exception as e:
-            print('FAILED: ', e)
+            logger.error(f"Error creating directories: {e}")
             return False
         
-    def read(self, path:str=None) -> str:
+    @staticmethod
+    def read(path:str=None) -> str:
         # check for presence of Domaille directory, return parent directory
         # or none if not found
         if os.path.isdir(f"{path}{os.sep}Domaille{os.sep}Processes{os.sep}Steps"):
@@ -296,27 +861,25 @@ class Settings():
         return f"{max_q}{films}{pads}{lube}"
         
     def write(self, directory:str):
+        file = f'{directory}{os.sep}Domaille{os.sep}Settings.txt'
         try:
-            with open(f'{directory}{os.sep}Domaille{os.sep}Settings.txt', 'w') as f:
-                f.write(self.file_format())
+            _write_text(file, self.file_format())
         except Exception as e:
-            print('FAILED: ', e)
+            logger.error(f"Error writing {file}: {e}")
             raise e
-        else: print('done.') 
+        else: logger.info(f"Settings written to {file}")
 
 
     @staticmethod
     def read(path=os.getcwd()) -> 'Settings':
         if not os.path.isdir(path):
-            print(f"Invalid directory: {path}")
-            path
+            logger.error(f"Invalid directory: {path}")
 
         file = f"{path}{os.sep}Domaille{os.sep}Settings.txt"
         try:
-            with open(file, 'r', encoding='ascii') as f:
-                settings = f.readlines()
+            settings = _read_text(file).splitlines()
         except Exception as e:
-            print('ERROR', e)
+            logger.error(f"Error reading {file}: {e}")
             return None
         for line in settings:
         # TODO: read Settings file
@@ -331,16 +894,193 @@ class Settings():
         return Settings(quantity, films, pads, lubricants)
     
 
+def _real(value:str):
+    '''parses a REAL field, whole numbers stay int so they write back unchanged'''
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+
+Field = namedtuple('Field', 'key attr type default')
+
+# conflicts are recipes edited in memory that changed or went away on disk
+Delta = namedtuple('Delta', 'added modified removed conflicts')
+
+# see LibraryWatcher, signatures holds the added and modified recipes'
+LibraryChange = namedtuple('LibraryChange', 'added modified removed settings signatures')
+
+SyncResult = namedtuple('SyncResult', 'copied deleted unchanged errors')
+
+
+class WipeResult(namedtuple('WipeResult', 'files dirs bytes errors thread')):
+    '''what Dommaile.wipe deleted, falsy if anything failed'''
+    __slots__ = ()
+
+    def __bool__(self):
+        return not self.errors
+
+
+# see RecipeList.validate, step is None for a header field
+Violation = namedtuple('Violation', 'recipe step field value message')
+
+
+class ValidationReport():
+    """Every violation found by RecipeList.validate, falsy if there are any.
+    
+    Usage:
+        >>> report = recipes.validate(settings)
+        >>> report
+        <ValidationReport(2 violations in 1 of 10000 recipes, 41ms)>
+        >>> report.by_recipe()["MyRecipe"]
+        [Violation(recipe='MyRecipe', step=2, field='film', value='Red 9um',
+                   message='not in Settings'), ...]
+    """
+    def __init__(self, violations:list, recipes:int, seconds:float):
+        self.violations = violations
+        self.recipes = recipes
+        self.seconds = seconds
+
+    def __bool__(self):
+        return not self.violations
+
+    def __iter__(self):
+        return iter(self.violations)
+
+    def __repr__(self):
+        failed = len({violation.recipe for violation in self.violations})
+        return (f"<ValidationReport({len(self.violations)} violations in {failed} "
+                f"of {self.recipes} recipes, {self.seconds*1000:.0f}ms)>")
+
+    def __str__(self):
+        return '\n'.join(f"{violation.recipe}"
+                         f"{'' if violation.step is None else f' step {violation.step}'}: "
+                         f"{violation.field} {violation.value!r} {violation.message}"
+                         for violation in self.violations)
+
+    def by_recipe(self) -> dict:
+        '''returns {recipe name: [Violation]}'''
+        recipes = {}
+        for violation in self.violations:
+            recipes.setdefault(violation.recipe, []).append(violation)
+        return recipes
+
+
+class ValidationError(ValueError):
+    '''raised by Dommaile.write(validate=True), report holds the violations'''
+    def __init__(self, report:ValidationReport):
+        super().__init__(f"{len(report.violations)} recipe violations:\n{report}")
+        self.report = report
+
+
+class Codec():
+    """Parses and formats one Domaille key/value file from a field schema.
+    
+    Each line of the file is ``<key> := <value>``. The parser looks every
+    key up in a dict in a single pass over the text and converts the value
+    with the field type. The formatter is one precompiled template filled
+    from an attrgetter, so writing a file is a single str.format call.
+    
+    Usage:
+        >>> STEP_CODEC.parse("rRecipeStepTime := 45\n")
+        {'time': 45}
+        >>> STEP_CODEC.format(RecipeStep(45))[:21]
+        'rRecipeStepTime := 45'
+    """
+    def __init__(self, *fields:Field):
+        self.fields = fields
+        self.attrs = tuple(field.attr for field in fields)
+        self.defaults = {field.attr: field.default for field in fields}
+        self._fields = {field.key: field for field in fields}
+        self._template = "".join(f"{field.key} := {{}}\n" for field in fields)
+        getter = attrgetter(*self.attrs)
+        self._getter = getter if len(fields) > 1 else lambda obj: (getter(obj),)
+
+    def parse(self, text:str) -> dict:
+        '''returns {attribute: value} for every known key in the text'''
+        values = {}
+        fields = self._fields
+        for line in text.splitlines():
+            key, sep, value = line.partition(':=')
+            if not sep:
+                continue
+            field = fields.get(key.strip())
+            if field is None:
+                logger.warning(f"Unknown setting: {line}")
+                continue
+            values[field.attr] = field.type(value.strip())
+        return values
+
+    def format(self, obj) -> str:
+        '''returns the file contents for obj'''
+        return self._template.format(*self._getter(obj))
+
+
+# Domaille file layouts. Keys are written in this order, so adding a
+# field to a file is one line here.
+RECIPE_CODEC = Codec(
+    Field('strRecipeDescription', 'description', str, ''),
+    Field('intRecipeNoOfSteps', 'no_of_steps', int, 3),
+    Field('intRecipeQty', 'quantity', int, 32),
+    Field('intRecipeReworkStep', 'rework_step', int, 1),
+)
+
+STEP_CODEC = Codec(
+    Field('rRecipeStepTime', 'time', _real, 75),
+    Field('rRecipeStepSpeed', 'speed', _real, 110),
+    Field('rRecipeStepSpeedRamp', 'speed_ramp', _real, 1),
+    Field('rRecipeStepPressure', 'pressure', _real, 16),
+    Field('rRecipeStepPressureRamp', 'pressure_ramp', _real, 1),
+    Field('rRecipeStepFCI', 'fci', _real, 5),
+    Field('rRecipeStepLowerSpeedLimit', 'lower_speed_limit', _real, 10),
+    Field('rRecipeStepUpperSpeedLimit', 'upper_speed_limit', _real, 10),
+    Field('rRecipeStepLowerPressureLimit', 'lower_pressure_limit', _real, 0.5),
+    Field('rRecipeStepUpperPressureLimit', 'upper_pressure_limit', _real, 0.5),
+    Field('rRecipeStepFixtureWeight', 'fixture_weight', _real, 0),
+    Field('intRecipeStepOpCode', 'op_code', int, 300),
+    Field('strRecipeStepFilm', 'film', str, "<None>"),
+    Field('strRecipeStepLubricant', 'lubricant', str, "<None>"),
+    Field('strRecipeStepPad', 'pad', str, "<None>"),
+    Field('strRecipeStepDescription1', 'description1', str, ""),
+    Field('strRecipeStepDescription2', 'description2', str, ""),
+    Field('rRecipeStepSpeedRampDn', 'speed_ramp_dn', _real, 1),
+    Field('rRecipeStepPressureRampDn', 'pressure_ramp_dn', _real, 1),
+)
+
+_STEP_DEFAULTS = tuple(STEP_CODEC.defaults.items())
+
+# (low, high) limits checked by RecipeList.validate, as entered by recipe.py
+# and the spin boxes of ui.ui and step.ui
+RECIPE_LIMITS = {'no_of_steps': (1, 9), 'quantity': (2, 72)}
+STEP_LIMITS = {'time': (10, 300), 'pressure': (0, 16), 'speed': (0, 120),
+               'speed_ramp': (0, 60), 'pressure_ramp': (0, 60),
+               'speed_ramp_dn': (0, 60), 'pressure_ramp_dn': (0, 60)}
+
+# parsed steps by content digest (or index row), see RecipeStep._parse
+_step_cache = {}
+STEP_CACHE_SIZE = 4096
+
+
+def _parse_shared_step(text:str) -> 'RecipeStep':
+    return RecipeStep._parse(text, intern=True)
+
+
 class RecipeStep():
     """Represents a single step in a polishing recipe.
     
-    Contains all parameters for one polishing operation step.
+    Contains all parameters for one polishing operation step. The fields
+    are the STEP_CODEC attributes, stored in __slots__ so a large library
+    does not carry a __dict__ per step.
     
     Usage:
         >>> step = RecipeStep(time=45, pressure=12)
         >>> step.speed = 120
         >>> step.film = "Brown 5um"
+        >>> step.dirty  # changed since it was read or written
+        True
     """
+    __slots__ = STEP_CODEC.attrs + ('_dirty', '_shared')
+
     def __init__(self, time=75, pressure=16, **kwargs):
         """Initialize a recipe step.
         
@@ -349,61 +1089,112 @@ class RecipeStep():
             pressure (int): Pressure in lbs.
             **kwargs: Additional step parameters
         """
-        self.time = time
-        self.speed = 110
-        self.speed_ramp = 1
-        self.pressure = pressure
-        self.pressure_ramp = 1
-        self.fci = 5
-        self.lower_speed_limit = 10
-        self.upper_speed_limit = 10
-        self.lower_pressure_limit = 0.5
-        self.upper_pressure_limit = 0.5
-        self.fixture_weight = 0
-        self.op_code = 300
-        self.film = "<None>"
-        self.pad = "<None>"
-        self.lubricant = "<None>"
-        self.description1 = ""
-        self.description2 = ""
-        self.speed_ramp_dn = 1
-        self.pressure_ramp_dn = 1
+        _set = object.__setattr__
+        for attr, default in _STEP_DEFAULTS:
+            _set(self, attr, default)
+        _set(self, 'time', time)
+        _set(self, 'pressure', pressure)
+        _set(self, '_dirty', True)
+        _set(self, '_shared', False)
         for k,v in kwargs.items():
             setattr(self, k, v)
-            
+
+    @staticmethod
+    def _from_values(values:dict) -> 'RecipeStep':
+        '''creates a clean step from parsed {attribute: value}, missing
+           fields take their default'''
+        step = RecipeStep.__new__(RecipeStep)
+        _set = object.__setattr__
+        for attr, default in _STEP_DEFAULTS:
+            _set(step, attr, values.get(attr, default))
+        _set(step, '_dirty', False)
+        _set(step, '_shared', False)
+        return step
+
+    @staticmethod
+    def _new(values:tuple, shared:bool = False) -> 'RecipeStep':
+        '''creates a clean step from a full row of STEP_CODEC values'''
+        step = RecipeStep.__new__(RecipeStep)
+        for setter, value in zip(_STEP_SETTERS, values):
+            setter(step, value)
+        _STEP_SETTERS_DIRTY(step, False)
+        _STEP_SETTERS_SHARED(step, shared)
+        return step
+
+    @staticmethod
+    def _parse(text:str, intern:bool = False) -> 'RecipeStep':
+        '''returns the step in a step file; files with the same content are
+           parsed once and, with intern, share one read-only step'''
+        key = hashlib.blake2b(text.encode(), digest_size=16).digest()
+        return RecipeStep._cached(key, intern, lambda: STEP_CODEC.parse(text))
+
+    @staticmethod
+    def _from_row(values:list, intern:bool = False) -> 'RecipeStep':
+        '''returns the step for a row of STEP_CODEC values, see _parse'''
+        # 12 and 12.0 are equal keys but format differently, so the types
+        # are part of the key
+        key = (*values, *map(type, values))
+        return RecipeStep._cached(key, intern, lambda: dict(zip(STEP_CODEC.attrs, values)))
+
+    @staticmethod
+    def _cached(key, intern:bool, parse) -> 'RecipeStep':
+        step = _step_cache.get(key)
+        if step is None:
+            step = RecipeStep._from_values(parse())
+            object.__setattr__(step, '_shared', True)
+            if len(_step_cache) >= STEP_CACHE_SIZE:
+                _step_cache.clear()
+            _step_cache[key] = step
+        return step if intern else step.copy()
+
+    @staticmethod
+    def cache_clear():
+        '''forgets every cached step file'''
+        _step_cache.clear()
+
+    def copy(self) -> 'RecipeStep':
+        '''returns an editable copy with the same fields'''
+        step = RecipeStep.__new__(RecipeStep)
+        _set = object.__setattr__
+        for attr in STEP_CODEC.attrs:
+            _set(step, attr, getattr(self, attr))
+        _set(step, '_dirty', self._dirty)
+        _set(step, '_shared', False)
+        return step
+
+    @property
+    def shared(self) -> bool:
+        '''True for an interned step used by several recipes, which is
+           read-only; the Recipe hands out editable copies'''
+        return self._shared
+
+    def __setattr__(self, name, value):
+        if name[0] != '_':
+            if self._shared:
+                raise TypeError("shared RecipeStep is read-only, edit it "
+                                "through recipe[step_number] or copy() it")
+            object.__setattr__(self, '_dirty', True)
+        object.__setattr__(self, name, value)
+
+    @property
+    def dirty(self) -> bool:
+        '''True if the step changed since it was read or written'''
+        return self._dirty
 
     def __repr__(self):
         return f"<Step({self.time}s @ {self.pressure}lbs.)>"
 
     def file_format(self):
-        time = f"rRecipeStepTime := {self.time}\n"
-        speed = f"rRecipeStepSpeed := {self.speed}\n"
-        speed_ramp = f"rRecipeStepSpeedRamp := {self.speed_ramp}\n"
-        pressure = f"rRecipeStepPressure := {self.pressure}\n"
-        pressure_ramp =f"rRecipeStepPressureRamp := {self.pressure_ramp}\n"
-        fci = f"rRecipeStepFCI := {self.fci}\n"
-        lower_speed_limit = f"rRecipeStepLowerSpeedLimit := {self.lower_speed_limit}\n"
-        upper_speed_limit = f"rRecipeStepUpperSpeedLimit := {self.upper_speed_limit}\n"
-        lower_pressure_limit = f"rRecipeStepLowerPressureLimit := {self.lower_pressure_limit}\n"
-        upper_pressure_limit = f"rRecipeStepUpperPressureLimit := {self.upper_pressure_limit}\n"
-        fixture_weight = f"rRecipeStepFixtureWeight := {self.fixture_weight}\n"
-        op_code = f"intRecipeStepOpCode := {self.op_code}\n"
-        film = f"strRecipeStepFilm := {self.film}\n"
-        lubricant = f"strRecipeStepLubricant := {self.lubricant}\n"
-        pad = f"strRecipeStepPad := {self.pad}\n"
-        desc1 = f"strRecipeStepDescription1 := {self.description1}\n"
-        desc2 = f"strRecipeStepDescription2 := {self.description2}\n"
-        speed_ramp_dn = f"rRecipeStepSpeedRampDn := {self.speed_ramp_dn}\n"
-        pressure_ramp_dn = f"rRecipeStepPressureRampDn := {self.pressure_ramp_dn}\n"
-
-        return (f"{time}{speed}{speed_ramp}{pressure}{pressure_ramp}"
-                f"{fci}{lower_speed_limit}{upper_speed_limit}"
-                f"{lower_pressure_limit}{upper_pressure_limit}"
-                f"{fixture_weight}{op_code}{film}{lubricant}{pad}"
-                f"{desc1}{desc2}{speed_ramp_dn}{pressure_ramp_dn}")
+        return STEP_CODEC.format(self)
         
    
   
+# slot setters of the STEP_CODEC fields, bypass __setattr__ to build clean steps
+_STEP_SETTERS = tuple(getattr(RecipeStep, attr).__set__ for attr in STEP_CODEC.attrs)
+_STEP_SETTERS_DIRTY = RecipeStep._dirty.__set__
+_STEP_SETTERS_SHARED = RecipeStep._shared.__set__
+
+
 class RecipeList(list):
     """Maintains a list of Recipe objects with type checking.
     
@@ -414,8 +1205,14 @@ class RecipeList(list):
         >>> recipes.append(Recipe("test"))  # Add single recipe
         >>> recipes.read("C:/MyData")  # Load all recipes from disk
     """
-    def __init__(self, input=None):
+    def __init__(self, input=None, workers:int = None, lazy:bool = False):
         super().__init__()
+        self.errors = []
+        self._directory, self._workers, self._lazy = None, workers, lazy
+        self._index = self._intern = False
+        self._signatures = {}
+        self._pending = None
+        self._search = None
         if isinstance(input, Recipe):
             self.append(input)
         elif isinstance(input, list):
@@ -423,111 +1220,847 @@ class RecipeList(list):
                 self.append(recipe)
         elif isinstance(input, str) or isinstance(input, Path):
             # If initialized with a path, read recipes from that directory
-            self.read(input)
+            self.read(input, workers, lazy)
     
     def append(self, item):
         if not isinstance(item, Recipe):
             raise TypeError("Can only add Recipe objects")
         super().append(item)
+        if self._search is not None:
+            self._search.add([item])
         
     def extend(self, items):
+        items = list(items)
         if not all(isinstance(item, Recipe) for item in items):
             raise TypeError("Can only add Recipe objects")
         super().extend(items)
+        if self._search is not None:
+            self._search.add(items)
+
+    def __iadd__(self, items):
+        self.extend(items)
+        return self
+
+    def insert(self, index, item):
+        if not isinstance(item, Recipe):
+            raise TypeError("Can only add Recipe objects")
+        super().insert(index, item)
+        if self._search is not None:
+            self._search.add([item])
         
     def __setitem__(self, index, item):
         if not isinstance(item, Recipe):
             raise TypeError("Can only add Recipe objects")
+        old = self[index]
         super().__setitem__(index, item)
+        if self._search is not None:
+            self._search.remove([old])
+            self._search.add([item])
 
-    def write(self, directory):
-        for recipe in self:
-            recipe.write(directory)
-    
-    def read(self, directory):
-        # read all files in Processes directory
+    def __delitem__(self, index):
+        old = self[index]
+        super().__delitem__(index)
+        if self._search is not None:
+            self._search.remove(old if isinstance(index, slice) else [old])
+
+    def remove(self, item):
+        super().remove(item)
+        if self._search is not None:
+            self._search.remove([item])
+
+    def pop(self, index=-1):
+        item = super().pop(index)
+        if self._search is not None:
+            self._search.remove([item])
+        return item
+
+    def clear(self):
+        super().clear()
+        if self._search is not None:
+            self._search.clear()
+
+    @property
+    def search_index(self) -> 'SearchIndex':
+        '''the SearchIndex of the list, built on first use and kept up to
+           date as recipes are added, replaced, removed, written or
+           refreshed'''
+        if self._search is None:
+            self._search = SearchIndex(self)
+        return self._search
+
+    def search(self, query:str = '', **fields) -> list:
+        '''returns the recipes matching every term, see SearchIndex.search'''
+        return self.search_index.search(query, **fields)
+
+    def write(self, directory, force:bool = False):
+        '''writes the recipes that changed since they were read or written,
+           or every recipe with force=True'''
+        written = self._unwritten(directory, force)
+        RecipeList.write_all(written, directory, self._workers)
+        self._wrote(directory, written)
+
+    @staticmethod
+    def stream(directory, pattern:str = None, lazy:bool = False):
+        """Yield the recipes of a directory one at a time.
+        
+        Recipes are read as the Processes directory is scanned, in the
+        order the file system lists them, and nothing is kept once a
+        recipe is yielded: memory stays flat however large the library
+        is. Stop iterating, or close the generator, to stop reading.
+        Recipes that fail to load are logged and skipped, and a directory
+        without a Processes folder yields nothing.
+        
+        Args:
+            directory (str): Parent directory of the Domaille folder
+            pattern (str, optional): Only recipes whose file name matches
+                this shell-style pattern, like "SC-APC*"
+            lazy (bool): Yield header-only recipes, the steps are read
+                if they are used, see Recipe.read
+            
+        Usage:
+            >>> for recipe in RecipeList.stream("E:/", "LC-*"):
+            ...     if recipe.quantity > 48:
+            ...         break
+        """
         process_dir = f"{directory}{os.sep}Domaille{os.sep}Processes"
         if not os.path.isdir(process_dir):
-            return self
-            
-        
-        for file in os.listdir(process_dir):
-            try:
-                if os.path.isfile(os.path.sep.join([process_dir, file])):
-                    recipe = Recipe.read(file, directory)
-                    if recipe:
-                        self.append(recipe)
-            except Exception as e:
-                print(f"Error reading recipes: {e}"
-                      f"\nFile: {file}")
+            logger.error(f"Invalid directory: {directory}")
+            return
+        with os.scandir(process_dir) as entries:
+            for entry in entries:
+                if pattern is not None and not fnmatch.fnmatch(entry.name, pattern):
+                    continue
+                if not entry.is_file():
+                    continue
+                recipe = Recipe.read(entry.name, directory, lazy)
+                if recipe is not None:
+                    yield recipe
 
-class Recipe():
-    """Represents a complete polishing recipe with multiple steps.
-    
-    Contains recipe metadata and ordered list of RecipeStep objects.
-    
-    Usage:
-        >>> recipe = Recipe("MyRecipe", no_of_steps=3)
-        >>> recipe[1] = RecipeStep(45, 12)  # Set first step
-        >>> recipe.write("C:/MyData")  # Save to disk
-    """
-    def __init__(self, description:str, no_of_steps:int = 3, 
-                 quantity:int = 32, rework_step:int = 1, *steps:RecipeStep):
-        """Initialize a new recipe.
+    @staticmethod
+    def write_all(recipes, directory, workers:int = 8, batch:int = 256) -> int:
+        """Write any number of recipes in one pass.
+        
+        The directories are created once, each recipe's files are
+        formatted before they are written and workers threads write
+        them. recipes can be any iterable, a generator such as
+        Recipe.sweep is consumed batch recipes at a time.
         
         Args:
-            description (str): Recipe name/description
-            no_of_steps (int): Number of polishing steps
-            quantity (int): Default batch quantity
-            rework_step (int): Step to return to for rework
-            *steps (RecipeStep): Initial step definitions
+            recipes (iterable): Recipes to write
+            directory (str): Parent directory of the Domaille folder
+            workers (int, optional): Number of writer threads, None
+                writes one recipe at a time
+            batch (int): Recipes taken from the iterable at once
+            
+        Returns:
+            int: Number of recipes written
+            
+        Usage:
+            >>> RecipeList.write_all(base.sweep(time=range(30, 300, 5)), "E:/")
+            54
         """
-        no_of_steps = int(no_of_steps)
-        self.description = description
-        self.no_of_steps = 3 # default to 3 steps
-        self.quantity = quantity
-        self.rework_step = rework_step
-
-        self._steps = []
-        if steps:
-           for step in steps:
-               self._steps.append(step)
-        else:            
-            for _ in range(no_of_steps):
-                self._steps.append(RecipeStep())
+        process_dir = f"{directory}{os.sep}Domaille{os.sep}Processes"
+        steps_dir = f"{process_dir}{os.sep}Steps"
+        os.makedirs(steps_dir, exist_ok=True)
+        write = lambda recipe: recipe._write_files(directory, process_dir, steps_dir)
+        recipes = iter(recipes)
+        count = 0
+        if not workers or workers < 2:
+            for recipe in recipes:
+                write(recipe)
+                count += 1
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                while chunk := list(itertools.islice(recipes, batch)):
+                    for _ in pool.map(write, chunk):
+                        pass
+                    count += len(chunk)
+        logger.info(f"{count} recipes written to {process_dir}")
+        return count
 
-    def __repr__(self): 
-        return f"<Recipe({self.description}, {self.no_of_steps} steps)>"
-    
-    def append(self, step:RecipeStep):
-        self._steps.append(step)
+    async def write_async(self, directory, force:bool = False, limit:int = 16):
+        '''coroutine version of write, writes up to limit recipes at once
+           in worker threads'''
+        loop = asyncio.get_running_loop()
+        recipes = self._unwritten(directory, force)
+        with ThreadPoolExecutor(max_workers=limit) as pool:
+            await asyncio.gather(*(loop.run_in_executor(pool, recipe.write, directory)
+                                   for recipe in recipes))
+        await loop.run_in_executor(None, self._wrote, directory, recipes)
 
+    def _unwritten(self, directory, force:bool) -> list:
+        '''the recipes write() has to write to directory'''
+        return [recipe for recipe in self
+                if force or recipe.dirty or recipe._source is None
+                or recipe._source[1] != directory]
 
-    def __getitem__(self, index) -> RecipeStep:
-        if index == 0:
-            return None
+    def _wrote(self, directory, recipes:list):
+        '''updates the stat signatures and search index after the recipes
+           were written'''
+        if self._search is not None:
+            # written recipes are the ones that were edited
+            self._search.add(recipes)
+        written = [recipe._source[0] for recipe in recipes]
+        if written and self._directory is not None and directory == self._directory:
+            # so refresh() does not report our own writes as changes
+            for recipe in recipes:
+                name = recipe._source[0]
+                numbers = {f"{num:0>3}" for num, step
+                           in enumerate(recipe._shared_steps(), start=1) if step}
+                previous = self._signatures.get(name)
+                if previous is not None:
+                    # step files left over from a longer version of the recipe
+                    numbers.update(number for number, *_ in previous[1])
+                signature = RecipeList._signature(directory, name, numbers)
+                if signature is not None:
+                    self._signatures[name] = signature
+            if self._index:
+                LibraryIndex(directory).save(self, written)
+    
+    def read(self, directory, workers:int = None, lazy:bool = False,
+             index:bool = False, intern:bool = False, progress=None,
+             cancel:threading.Event = None):
+        """Read every recipe in the Processes directory.
+        
+        Recipes are loaded in filename order. Files that fail to load are
+        skipped and collected in ``self.errors`` as (filename, exception).
+        The stat signature of every file read is kept for refresh().
+        
+        Args:
+            directory (str): Parent directory of the Domaille folder
+            workers (int, optional): Number of threads used to load recipes
+                concurrently, None loads them one at a time
+            lazy (bool): Only read the recipe headers, see Recipe.read
+            index (bool): Take recipes whose files did not change from the
+                LibraryIndex and update it with the ones that were read
+            intern (bool): Identical steps share one read-only RecipeStep,
+                see Recipe.read
+            progress (callable, optional): Called as progress(done, total)
+                after each recipe file is read
+            cancel (threading.Event, optional): Stops reading once set,
+                the list keeps the recipes read so far and a refresh()
+                reads the rest
+            
+        Usage:
+            >>> recipes = RecipeList()
+            >>> recipes.read("E:/", workers=16)  # network share
+            >>> recipes.errors
+            []
+        """
+        stale = self._begin_read(directory, workers, lazy, index, intern)
+        self._end_read(self._load(stale, progress, cancel))
+        return self
+
+    async def read_async(self, directory, limit:int = 16, lazy:bool = False,
+                         index:bool = False, intern:bool = False) -> 'RecipeList':
+        """Coroutine version of read.
+        
+        The directory scan, index and up to limit recipe files at a time
+        are read in worker threads, so the event loop keeps running while
+        a slow share answers.
+        
+        Usage:
+            >>> recipes = await RecipeList().read_async("E:/", limit=32)
+        """
+        loop = asyncio.get_running_loop()
+        stale = await loop.run_in_executor(None, self._begin_read,
+                                           directory, limit, lazy, index, intern)
+        with ThreadPoolExecutor(max_workers=limit) as pool:
+            results = await asyncio.gather(*(loop.run_in_executor(pool, self._load_one, name)
+                                             for name in stale))
+        await loop.run_in_executor(None, self._end_read, self._collect(stale, results))
+        return self
+
+    def _begin_read(self, directory, workers:int, lazy:bool, index:bool,
+                    intern:bool) -> list:
+        '''scans directory and the index, returns the names of the recipes
+           that have to be read from their files'''
+        self.errors = []
+        self._directory, self._workers, self._lazy = directory, workers, lazy
+        self._index, self._intern = index, intern
+        self._signatures = {}
+        self._pending = None
+        process_dir = f"{directory}{os.sep}Domaille{os.sep}Processes"
+        if not os.path.isdir(process_dir):
+            return []
+
+        signatures = RecipeList._scan(directory)
+        cached = LibraryIndex(directory).load() if index else {}
+        fresh = {name: (header, steps) for name, (signature, header, steps)
+                 in cached.items() if name in signatures
+                 and signature == json.dumps(signatures[name])
+                 and (lazy or steps is not None)}
+        self._pending = (signatures, cached, fresh)
+        return sorted(signatures.keys() - fresh.keys())
+
+    def _end_read(self, loaded:list):
+        '''adds the recipes read from their files and the ones taken from
+           the index, in name order'''
+        if self._pending is None:
+            return
+        signatures, cached, fresh = self._pending
+        self._pending = None
+        directory, lazy, index = self._directory, self._lazy, self._index
+        loaded = dict(loaded)
+
+        for name in sorted(signatures):
+            if name in loaded:
+                recipe = loaded[name]
+            elif name in fresh:
+                header, steps = fresh[name]
+                if lazy:
+                    steps = None
+                else:
+                    steps = [RecipeStep._from_row(values, self._intern)
+                             for values in steps]
+                recipe = Recipe._build(name, directory, header, steps, self._intern)
+            else:
+                continue
+            self.append(recipe)
+            self._signatures[name] = signatures[name]
+
+        removed = cached.keys() - signatures.keys()
+        if index and (loaded or removed or not cached):
+            LibraryIndex(directory).save(self, list(loaded) if cached else None,
+                                         removed)
+
+    def refresh(self, directory=None) -> 'Delta':
+        """Re-read only the recipes that changed on disk since the last read.
+        
+        Compares the (mtime, size, inode) of every header and step file
+        with the ones seen by read() or the previous refresh(). Recipes
+        that fail to load are kept as they were, reported in self.errors
+        and retried on the next refresh. Recipes that were never written
+        to disk are left alone, and so are recipes edited since they were
+        read: they are reported as conflicts until they are written.
+        
+        Args:
+            directory (str, optional): Directory to track if the list was
+                never read, defaults to the directory last read
+            
+        Returns:
+            Delta: Names of the added, modified, removed and conflicting
+                recipes
+            
+        Usage:
+            >>> recipes = RecipeList("E:/")
+            >>> recipes.refresh()
+            Delta(added=['new'], modified=[], removed=['old'], conflicts=[])
+        """
+        if self._directory is None:
+            # never read, start tracking the directory
+            self._directory = directory
+        elif directory is not None and directory != self._directory:
+            raise ValueError(f"RecipeList was read from {self._directory}")
+        directory = self._directory
+        self.errors = []
+        if directory is None or not os.path.isdir(
+                f"{directory}{os.sep}Domaille{os.sep}Processes"):
+            return Delta([], [], [], [])
+
+        current = RecipeList._scan(directory)
+        previous = self._signatures
+        changed = sorted(name for name in current
+                         if current[name] != previous.get(name))
+        removed = sorted(previous.keys() - current.keys())
+        return self._update(current, changed, removed)
+
+    def apply(self, change:'LibraryChange') -> 'Delta':
+        """Apply a change reported by a LibraryWatcher without a re-scan.
+        
+        Loads only the added and modified recipes and drops the removed
+        ones. Recipes that are already current, like the ones this list
+        just wrote, are skipped.
+        
+        Args:
+            change (LibraryChange): Change seen in the directory the list
+                was read from
+            
+        Returns:
+            Delta: Names of the added, modified, removed and conflicting
+                recipes, see refresh
+            
+        Usage:
+            >>> watcher = LibraryWatcher("E:/", queue.put)
+            >>> recipes.apply(queue.get())
+            Delta(added=[], modified=['test'], removed=[], conflicts=[])
+        """
+        self.errors = []
+        if self._directory is None:
+            return Delta([], [], [], [])
+        previous = self._signatures
+        changed = [name for name in change.added + change.modified
+                   if change.signatures[name] != previous.get(name)]
+        removed = [name for name in change.removed if name in previous]
+        return self._update(change.signatures, changed, removed)
+
+    def _update(self, current:dict, changed:list, removed:list) -> 'Delta':
+        '''loads the changed recipes and drops the removed ones, current
+           holds the signatures of the changed recipes. Recipes with
+           unsaved edits are kept and their signatures left stale, so
+           they stay conflicts until written'''
+        directory = self._directory
+        previous = self._signatures
+        recipes = {}
+        unsaved = []
+        for recipe in self:
+            if recipe._source is not None and recipe._source[1] == directory:
+                recipes[recipe._source[0]] = recipe
+            else:
+                unsaved.append(recipe)
+
+        conflicts = sorted(name for name in (*changed, *removed)
+                           if name in recipes and recipes[name].dirty)
+        if conflicts:
+            logger.warning(f"Kept unsaved edits to {', '.join(conflicts)}, "
+                           f"changed on disk")
+            changed = [name for name in changed if name not in conflicts]
+            removed = [name for name in removed if name not in conflicts]
+        added, modified = [], []
+        loaded, dropped = [], []
+        for name, recipe in self._load(changed):
+            (modified if name in previous else added).append(name)
+            if name in recipes:
+                dropped.append(recipes[name])
+            recipes[name] = recipe
+            loaded.append(recipe)
+            previous[name] = current[name]
+        for name in removed:
+            if name in recipes:
+                dropped.append(recipes.pop(name))
+            del previous[name]
+        if self._search is not None:
+            self._search.remove(dropped)
+            self._search.add(loaded)
+
+        list.clear(self)
+        list.extend(self, [recipes[name] for name in sorted(recipes)])
+        list.extend(self, unsaved)
+        if self._index and (added or modified or removed):
+            LibraryIndex(directory).save(self, added + modified, removed)
+        return Delta(added, modified, removed, conflicts)
+
+    def _load(self, names:list, progress=None,
+              cancel:threading.Event = None) -> list:
+        '''loads the named recipes, returns [(name, recipe)] in order and
+           appends failures to self.errors'''
+        if self._workers and self._workers > 1:
+            with ThreadPoolExecutor(max_workers=self._workers) as pool:
+                results = pool.map(self._load_one, names)
+                if progress is not None or cancel is not None:
+                    results = RecipeList._track(results, len(names), progress,
+                                                cancel, pool)
+                results = list(results)
+        else:
+            results = map(self._load_one, names)
+            if progress is not None or cancel is not None:
+                results = RecipeList._track(results, len(names), progress, cancel)
+        return self._collect(names, results)
+
+    @staticmethod
+    def _track(results, total:int, progress, cancel:threading.Event,
+               pool:ThreadPoolExecutor = None):
+        '''yields the results, reporting progress(done, total) and
+           stopping once cancel is set'''
+        for done, result in enumerate(results, start=1):
+            yield result
+            if progress is not None:
+                progress(done, total)
+            if cancel is not None and cancel.is_set():
+                logger.info(f"Read cancelled after {done} of {total} recipes")
+                if pool is not None:
+                    pool.shutdown(wait=False, cancel_futures=True)
+                return
+
+    def _load_one(self, name:str) -> tuple:
+        '''returns (recipe, None) or (None, exception)'''
+        try:
+            return Recipe._load(name, self._directory, self._lazy, self._intern), None
+        except Exception as e:
+            return None, e
+
+    def _collect(self, names:list, results) -> list:
+        '''pairs names with loaded recipes, moving failures to self.errors'''
+        loaded = []
+        for name, (recipe, error) in zip(names, results):
+            if error is not None:
+                self.errors.append((name, error))
+            elif recipe is not None:
+                loaded.append((name, recipe))
+        return loaded
+
+    def to_columns(self, settings:'Settings' = None) -> 'RecipeColumns':
+        """Export the library as NumPy arrays, one row per step.
+        
+        Args:
+            settings (Settings, optional): Seeds the film, pad and lubricant
+                categories with the Settings lists, so a code is the index
+                into that list and values not in Settings come after them
+            
+        Returns:
+            RecipeColumns: The step and recipe columns
+        """
+        np = _numpy()
+        categories = {attr: {} for attr in RecipeColumns.CATEGORICAL}
+        if settings is not None:
+            for attr in RecipeColumns.CATEGORICAL:
+                for value in getattr(settings, attr):
+                    categories[attr].setdefault(value, len(categories[attr]))
+
+        steps = {attr: [] for attr in ('recipe', 'step') + STEP_CODEC.attrs}
+        recipes = {attr: [] for attr in ('name',) + RECIPE_CODEC.attrs}
+        reals = [field.attr for field in STEP_CODEC.fields if field.type is _real]
+        for index, recipe in enumerate(self):
+            recipes['name'].append(recipe._source[0] if recipe._source else None)
+            for attr in RECIPE_CODEC.attrs:
+                recipes[attr].append(getattr(recipe, attr))
+            for number, step in enumerate(recipe._shared_steps(), start=1):
+                steps['recipe'].append(index)
+                steps['step'].append(number)
+                for attr in STEP_CODEC.attrs:
+                    value = getattr(step, attr)
+                    if attr in categories:
+                        value = categories[attr].setdefault(value, len(categories[attr]))
+                    steps[attr].append(value)
+
+        dtypes = {str: object, int: np.int64, _real: np.float64}
+        # REAL fields become floats, remember which were whole numbers so
+        # from_columns formats them back unchanged
+        whole = {attr: np.array([type(value) is int for value in steps[attr]], dtype=bool)
+                 for attr in reals}
+        for field in STEP_CODEC.fields:
+            dtype = np.int32 if field.attr in categories else dtypes[field.type]
+            steps[field.attr] = np.array(steps[field.attr], dtype=dtype)
+        steps['recipe'] = np.array(steps['recipe'], dtype=np.int64)
+        steps['step'] = np.array(steps['step'], dtype=np.int64)
+        recipes['name'] = np.array(recipes['name'], dtype=object)
+        for field in RECIPE_CODEC.fields:
+            recipes[field.attr] = np.array(recipes[field.attr], dtype=dtypes[field.type])
+        return RecipeColumns(steps, recipes,
+                             {attr: list(codes) for attr, codes in categories.items()},
+                             whole)
+
+    def validate(self, settings:'Settings' = None,
+                 recipes:list = None) -> 'ValidationReport':
+        """Check the library against Settings and the field limits.
+        
+        One vectorized pass over to_columns checks every step field in
+        STEP_LIMITS and header field in RECIPE_LIMITS, that film, pad and
+        lubricant are in the Settings lists, that quantity is within
+        Settings.max_quantity, that rework_step is one of the steps and
+        that no_of_steps matches the steps in memory and, for unchanged
+        recipes, the step files on disk as last scanned.
+        
+        Args:
+            settings (Settings, optional): Settings to check against, the
+                Settings checks are skipped without them
+            recipes (list, optional): Only check these recipes of the list
+            
+        Returns:
+            ValidationReport: The violations, ordered by recipe and step
+            
+        Usage:
+            >>> report = domaille.recipes.validate(domaille.settings)
+            >>> if not report:
+            ...     print(report)
+            MyRecipe step 2: time 5 outside 10..300
+        """
+        start = time.perf_counter()
+        np = _numpy()
+        recipes = list(self if recipes is None else recipes)
+        names = [recipe._source[0] if recipe._source else recipe.description
+                 for recipe in recipes]
+        found = []  # (recipe row, step number, field, value, message)
+        readable, rows = RecipeList(), []   # rows: recipe row of each readable one
+        for row, recipe in enumerate(recipes):
+            try:
+                recipe._shared_steps()  # a lazy recipe reads its steps here
+            except OSError as e:
+                found.append((row, None, 'no_of_steps', recipe.no_of_steps,
+                              f"but the step files cannot be read: {e}"))
+            else:
+                readable.append(recipe)
+                rows.append(row)
+        columns = readable.to_columns(settings)
+        steps, headers = columns.steps, columns.recipes
+
+        def report(matches, field, values, message, step_rows=True):
+            for row in matches.tolist():
+                if step_rows:
+                    found.append((rows[steps['recipe'][row]], int(steps['step'][row]),
+                                  field, values(row), message))
+                else:
+                    found.append((rows[row], None, field, values(row), message))
+
+        for attr, (low, high) in STEP_LIMITS.items():
+            values = steps[attr]
+            # whole numbers were read as int, report them that way
+            report(np.flatnonzero((values < low) | (values > high)), attr,
+                   lambda row: _real(str(values[row].item()).removesuffix('.0')),
+                   f"outside {low}..{high}")
+        if settings is not None:
+            for attr in RecipeColumns.CATEGORICAL:
+                known, codes = len(getattr(settings, attr)), columns.categories[attr]
+                report(np.flatnonzero(steps[attr] >= known), attr,
+                       lambda row: codes[steps[attr][row]], "not in Settings")
+
+        for attr, (low, high) in RECIPE_LIMITS.items():
+            values = headers[attr]
+            report(np.flatnonzero((values < low) | (values > high)), attr,
+                   lambda row: values[row].item(), f"outside {low}..{high}", False)
+        quantity, no_of_steps = headers['quantity'], headers['no_of_steps']
+        if settings is not None:
+            report(np.flatnonzero(quantity > settings.max_quantity), 'quantity',
+                   lambda row: quantity[row].item(),
+                   f"above Settings max quantity {settings.max_quantity}", False)
+        rework = headers['rework_step']
+        report(np.flatnonzero((rework < 1) | (rework > no_of_steps)), 'rework_step',
+               lambda row: rework[row].item(), "is not one of the steps", False)
+        counts = np.bincount(steps['recipe'], minlength=len(no_of_steps))
+        for row in np.flatnonzero(counts != no_of_steps).tolist():
+            found.append((rows[row], None, 'no_of_steps', no_of_steps[row].item(),
+                          f"but the recipe has {counts[row]} steps"))
+        for row, recipe in enumerate(recipes):
+            # the step files seen by the last read, refresh or write
+            signature = self._signatures.get(names[row])
+            if (signature is not None and recipe._source is not None
+                    and recipe._source[1] == self._directory
+                    and not recipe.dirty and len(signature[1]) != recipe.no_of_steps):
+                found.append((row, None, 'no_of_steps', recipe.no_of_steps,
+                              f"but there are {len(signature[1])} step files"))
+
+        found.sort(key=lambda violation: (violation[0], violation[1] or 0))
+        violations = [Violation(names[row], step, field, value, message)
+                      for row, step, field, value, message in found]
+        return ValidationReport(violations, len(recipes), time.perf_counter() - start)
+
+    @staticmethod
+    def from_columns(columns:'RecipeColumns') -> 'RecipeList':
+        '''rebuilds the recipes exported by to_columns, as new unsaved recipes'''
+        np = _numpy()
+        steps = columns.steps
+        order = np.lexsort((steps['step'], steps['recipe']))
+        bounds = np.searchsorted(steps['recipe'][order],
+                                 np.arange(len(columns.recipes['description']) + 1))
+
+        convert = {}
+        for field in STEP_CODEC.fields:
+            if field.attr in columns.categories:
+                names = columns.categories[field.attr]
+                convert[field.attr] = names.__getitem__
+            elif field.type is not _real:
+                convert[field.attr] = field.type
+        columns_by_attr = []
+        for attr in STEP_CODEC.attrs:
+            values = steps[attr][order].tolist()
+            if attr in convert:
+                values = [convert[attr](value) for value in values]
+            elif columns.whole is not None and attr in columns.whole:
+                values = [int(value) if whole else value for value, whole
+                          in zip(values, columns.whole[attr][order].tolist())]
+            else:
+                # built without the masks, take whole numbers for int
+                values = [int(value) if value.is_integer() else value for value in values]
+            columns_by_attr.append((attr, values))
+
+        recipes = RecipeList()
+        headers = columns.recipes
+        for index in range(len(headers['description'])):
+            recipe_steps = [RecipeStep(**{attr: values[row]
+                                          for attr, values in columns_by_attr})
+                            for row in range(bounds[index], bounds[index+1])]
+            recipes.append(Recipe(str(headers['description'][index]),
+                                  int(headers['no_of_steps'][index]),
+                                  int(headers['quantity'][index]),
+                                  int(headers['rework_step'][index]), *recipe_steps))
+        return recipes
+
+    @staticmethod
+    def _signature(directory, name:str, numbers) -> tuple:
+        '''returns the signature _scan gives name from a stat of its header
+           and of the step files numbered numbers, None if the header is
+           missing. Step files not in numbers are not looked for'''
+        process_dir = f"{directory}{os.sep}Domaille{os.sep}Processes"
+        try:
+            stat = os.stat(f"{process_dir}{os.sep}{name}")
+        except OSError:
+            return None
+        steps = []
+        for number in numbers:
+            try:
+                step = os.stat(f"{process_dir}{os.sep}Steps{os.sep}{name}.{number}")
+            except OSError:
+                continue
+            steps.append((number, step.st_mtime_ns, step.st_size, step.st_ino))
+        return ((stat.st_mtime_ns, stat.st_size, stat.st_ino), tuple(sorted(steps)))
+
+    @staticmethod
+    def _scan(directory) -> dict:
+        '''returns {recipe name: signature} for every header in Processes,
+           the signature holds (mtime, size, inode) of the header and of
+           each of its step files'''
+        process_dir = f"{directory}{os.sep}Domaille{os.sep}Processes"
+        start = time.perf_counter() if _stats is not None else None
+        headers = {}
+        with os.scandir(process_dir) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    stat = entry.stat()
+                    headers[entry.name] = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        if start is not None:
+            _stats._scan(process_dir, len(headers), time.perf_counter() - start)
+            start = time.perf_counter()
+
+        steps = {}
+        count = 0
+        steps_dir = f"{process_dir}{os.sep}Steps"
+        if os.path.isdir(steps_dir):
+            with os.scandir(steps_dir) as entries:
+                for entry in entries:
+                    count += 1
+                    name, _, number = entry.name.rpartition('.')
+                    if name in headers and entry.is_file():
+                        stat = entry.stat()
+                        steps.setdefault(name, []).append(
+                            (number, stat.st_mtime_ns, stat.st_size, stat.st_ino))
+            if start is not None:
+                _stats._scan(steps_dir, count, time.perf_counter() - start)
+
+        return {name: (header, tuple(sorted(steps.get(name, ()))))
+                for name, header in headers.items()}
+
+class Recipe():
+    """Represents a complete polishing recipe with multiple steps.
+    
+    Contains recipe metadata and ordered list of RecipeStep objects.
+    
+    Usage:
+        >>> recipe = Recipe("MyRecipe", no_of_steps=3)
+        >>> recipe[1] = RecipeStep(45, 12)  # Set first step
+        >>> recipe.write("C:/MyData")  # Save to disk
+        >>> recipe.dirty  # changed since it was read or written
+        False
+    """
+    _intern = False # read with shared steps, see Recipe.read
+
+    def __init__(self, description:str, no_of_steps:int = 3, 
+                 quantity:int = 32, rework_step:int = 1, *steps:RecipeStep):
+        """Initialize a new recipe.
+        
+        Args:
+            description (str): Recipe name/description
+            no_of_steps (int): Number of polishing steps
+            quantity (int): Default batch quantity
+            rework_step (int): Step to return to for rework
+            *steps (RecipeStep): Initial step definitions
+        """
+        no_of_steps = int(no_of_steps)
+        self._source = None # (file name, directory) once read or written
+        self.description = description
+        self.no_of_steps = no_of_steps
+        self.quantity = quantity
+        self.rework_step = rework_step
+
+        self._steps = []
+        if steps:
+           for step in steps:
+               self._steps.append(step)
+        else:            
+            for _ in range(no_of_steps):
+                self._steps.append(RecipeStep())
+
+    def __repr__(self): 
+        return f"<Recipe({self.description}, {self.no_of_steps} steps)>"
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name[0] != '_':
+            object.__setattr__(self, '_dirty', True)
+
+    @property
+    def dirty(self) -> bool:
+        '''True if the header or any step changed since the recipe was
+           read or written'''
+        return self._dirty or (self._steps is not None
+                               and any(step._dirty for step in self._steps))
+
+    def _mark_clean(self):
+        self._dirty = False
+        for step in self._steps or ():
+            if not step._shared:
+                step._dirty = False
+    
+    def append(self, step:RecipeStep):
+        self._shared_steps().append(step)
+        self._dirty = True
+
+    @property
+    def steps(self) -> list:
+        '''the step list, read from the step files on first use by a lazy
+           recipe. Interned steps are swapped for editable copies first,
+           the caller may edit what it gets'''
+        steps = self._shared_steps()
+        for index, step in enumerate(steps):
+            if step is not None and step._shared:
+                steps[index] = step.copy()
+        return steps
+
+    def _shared_steps(self) -> list:
+        '''the step list as stored, interned steps included, for code
+           that only reads the steps'''
+        if self._steps is None:
+            self._steps = Recipe._read_steps(*self._source, self.no_of_steps,
+                                             self._intern)
+        return self._steps
+
+    @property
+    def loaded(self) -> bool:
+        '''False until the steps of a lazy recipe have been read'''
+        return self._steps is not None
+
+    def unload(self) -> bool:
+        '''drops the steps of an unchanged recipe read from disk, they are
+           read again on next use. Returns False if the recipe must stay
+           in memory'''
+        if self._source is None or self.dirty:
+            return False
+        self._steps = None
+        return True
+
+    def __getitem__(self, index) -> RecipeStep:
+        steps = self._shared_steps()
+        if index == 0:
+            return None
         elif index < 0:
-            return self._steps[index]
-        elif index > len(self._steps):
+            index = len(steps) + index
+        elif index > len(steps):
             return None
         else:
-            return self._steps[index-1]
+            index = index - 1
+        step = steps[index]
+        if step is not None and step._shared:
+            # copy on write: the caller may edit what it gets
+            step = steps[index] = step.copy()
+        return step
   
     def __setitem__(self, index, value:RecipeStep) -> None:
-        self._steps[index-1] = value
+        self._shared_steps()[index-1] = value
+        self._dirty = True
 
     def __iter__(self):
-        return iter(self._steps)
+        '''yields the steps, copying interned ones as they are reached like
+           __getitem__ does'''
+        steps = self._shared_steps()
+        for index, step in enumerate(steps):
+            if step is not None and step._shared:
+                step = steps[index] = step.copy()
+            yield step
 
     def __len__(self):
-        return len(self._steps)
+        return len(self._shared_steps())
     
     def file_format(self):
-        desc = f"strRecipeDescription := {self.description}\n"
-        steps = f"intRecipeNoOfSteps := {self.no_of_steps}\n"
-        qty = f"intRecipeQty := {self.quantity}\n"
-        rework = f"intRecipeReworkStep := {self.rework_step}\n"
-        return f"{desc}{steps}{qty}{rework}"
+        return RECIPE_CODEC.format(self)
     
     def write(self, directory):
         process_dir = f"{directory}{os.sep}Domaille{os.sep}Processes"
@@ -535,142 +2068,1280 @@ class Recipe():
         try:
             os.makedirs(steps_dir, exist_ok=True)
         except OSError as e:
-            print(f"Error creating directories: {e}")
+            logger.error(f"Error creating directories: {e}")
             return False
+        self._write_files(directory, process_dir, steps_dir)
 
+    def _write_files(self, directory, process_dir:str, steps_dir:str):
+        '''writes the header and step files into existing directories, the
+           text of every file is formatted before the first is opened'''
+        files = [(f'{process_dir}{os.sep}{self.description}', self.file_format())]
+        for num, step in enumerate(self._shared_steps(), start=1):
+            if step:
+                files.append((f'{steps_dir}{os.sep}{self.description}.{num:0>3}',
+                              step.file_format()))
         try:
-            with open(f'{process_dir}{os.sep}{self.description}', 'w') as f:
-                f.write(self.file_format())
-            for num, step in enumerate(self, start=1):
-                if step:
-                    with open(f'{steps_dir}{os.sep}{self.description}.{num:0>3}', 'w') as f:
-                        f.write(self[num].file_format())
+            for file, text in files:
+                _write_text(file, text)
         except Exception as e:
-            print('FAILED: ', e)
+            logger.error(f"Error writing {self.description}: {e}")
             raise e
         else: 
-            print(f'{self.description} written to {process_dir}')
+            self._source = (self.description, directory)
+            self._mark_clean()
+            logger.debug(f'{self.description} written to {process_dir}')
+
+    def copy(self, description:str = None) -> 'Recipe':
+        '''returns an unsaved copy with editable copies of the steps,
+           named description if given'''
+        return Recipe(self.description if description is None else description,
+                      self.no_of_steps, self.quantity, self.rework_step,
+                      *(None if step is None else step.copy()
+                        for step in self._shared_steps()))
+
+    def sweep(self, name:str = None, step:int = None, **params):
+        """Generate a copy of the recipe for every combination of values.
+        
+        The combinations are expanded lazily, each recipe is created as
+        the generator is consumed so a grid of thousands is never held
+        in memory. Header fields (quantity, rework_step) set the recipe,
+        step fields set the given step or every step. The number of
+        steps cannot be swept.
+        
+        Args:
+            name (str, optional): Format string for the descriptions,
+                filled with the base description and the parameter
+                values. Defaults to the description and every value
+                joined by underscores. Descriptions are file names,
+                combinations that format alike overwrite each other
+            step (int, optional): Step number the step fields apply to,
+                every step when None
+            **params: Iterable of values for each field to sweep
+            
+        Returns:
+            generator: Unsaved Recipe objects, the last parameter varies
+                fastest
+            
+        Usage:
+            >>> grid = base.sweep("{description}-{time}s-{pressure}lbs", step=2,
+            ...                   time=range(30, 91, 15), pressure=(8, 10, 12))
+            >>> RecipeList.write_all(grid, "E:/")
+            15
+        """
+        # the description is the name, and no_of_steps has to match the
+        # step list, so neither is swept
+        header = [field for field in params if field in RECIPE_CODEC.attrs
+                  and field not in ('description', 'no_of_steps')]
+        fields = [field for field in params if field in STEP_CODEC.attrs]
+        unknown = params.keys() - {*header, *fields}
+        if unknown:
+            raise ValueError(f"Cannot sweep {', '.join(sorted(unknown))}")
+        if step is not None and not 1 <= step <= len(self):
+            raise IndexError(f"{self.description} has no step {step}")
+        return self._sweep(name, step, header, fields, params)
+
+    def _sweep(self, name:str, step:int, header:list, fields:list, params:dict):
+        keys = list(params)
+        for values in itertools.product(*params.values()):
+            values = dict(zip(keys, values))
+            if name is None:
+                description = '_'.join([self.description, *map(str, values.values())])
+            else:
+                description = name.format(description=self.description, **values)
+            recipe = self.copy(description)
+            for field in header:
+                setattr(recipe, field, values[field])
+            steps = recipe.steps if step is None else [recipe.steps[step - 1]]
+            for target in steps:
+                if target is None:
+                    continue
+                for field in fields:
+                    setattr(target, field, values[field])
+            yield recipe
 
     @staticmethod
-    def read(name:str, directory) -> 'Recipe':
+    def read(name:str, directory, lazy:bool = False,
+             intern:bool = False) -> 'Recipe':
         """Load a recipe from disk.
         
         Args:
             name (str): Recipe name/filename
             directory (str): Directory containing recipe files
+            lazy (bool): Only read the header now, the step files are read
+                the first time a step is accessed
+            intern (bool): Steps with identical files share one read-only
+                RecipeStep; recipe[n], iterating the recipe and
+                recipe.steps swap in editable copies
             
         Returns:
             Recipe: Loaded recipe object or None if failed
             
         Usage:
             >>> recipe = Recipe.read("MyRecipe", "C:/MyData")
+            >>> recipe = Recipe.read("MyRecipe", "C:/MyData", lazy=True)
+            >>> recipe.loaded
+            False
         """
-        # get variables from files and create Recipe()
-        file = f"{directory}{os.sep}Domaille{os.sep}Processes{os.sep}{name}"
         try:
-            with open(file, 'r', encoding='ascii') as f:
-                recipe = f.readlines()
+            return Recipe._load(name, directory, lazy, intern)
         except FileNotFoundError as e:
-            print('File not found:', file)
+            logger.error(f"File not found: {e.filename}")
             return None
         except PermissionError as e:
-            print('Permission denied:', file)
-            return None
-        except IOError as e:
-            print('IO error reading file:', file)
+            logger.error(f"Permission denied: {e.filename}")
             return None
         except UnicodeDecodeError as e:
-            print('Invalid file encoding:', file)
+            logger.error(f"Invalid file encoding: {name}")
+            return None
+        except IOError as e:
+            logger.error(f"IO error reading file: {e.filename}")
             return None
         except Exception as e:
-            print('ERROR', e)
+            logger.error(f"Error reading recipe {name}: {e}")
             return None
+
+    @staticmethod
+    def _load(name:str, directory, lazy:bool = False,
+              intern:bool = False) -> 'Recipe':
+        '''loads a recipe from disk, raising on any error'''
+        start = time.perf_counter() if _stats is not None else None
+        file = f"{directory}{os.sep}Domaille{os.sep}Processes{os.sep}{name}"
+        header = {**RECIPE_CODEC.defaults, **_read_parsed(file, RECIPE_CODEC.parse)}
+
+        steps = None
+        if not lazy:
+            steps = Recipe._read_steps(name, directory, header['no_of_steps'], intern)
+        recipe = Recipe._build(name, directory, header, steps, intern)
+        if start is not None:
+            _stats._recipe(name, time.perf_counter() - start)
+        return recipe
+
+    @staticmethod
+    def _build(name:str, directory, header:dict, steps:list = None,
+               intern:bool = False) -> 'Recipe':
+        '''creates the recipe stored as name in directory from its header
+           fields, a recipe built without steps reads them on first use'''
+        if steps is None:
+            recipe = Recipe.__new__(Recipe)
+            recipe.__dict__.update(header)
+            recipe._steps = None
+        else:
+            recipe = Recipe(header['description'], header['no_of_steps'],
+                            header['quantity'], header['rework_step'], *steps)
+        recipe._source = (name, directory)
+        if intern:
+            recipe._intern = True
+        recipe._mark_clean()
+        return recipe
+
+    @staticmethod
+    def _read_steps(name:str, directory, no_of_steps:int,
+                    intern:bool = False) -> list:
+        '''reads the step files of a recipe, raising on any error'''
+        steps = []
+        steps_dir = f"{directory}{os.sep}Domaille{os.sep}Processes{os.sep}Steps"
+        for step_number in range(1, no_of_steps+1):
+            file = f"{steps_dir}{os.sep}{name}.{step_number:0>3}"
+            step = _read_parsed(file, _parse_shared_step)
+            steps.append(step if intern else step.copy())
+        return steps
+
+class LibraryIndex():
+    """Cache of the parsed recipe library, kept next to the text files.
     
-        for line in recipe:
-            if line.startswith('strRecipeDescription'):
-                description = line.split(":=")[-1].strip()
-            elif line.startswith('intRecipeNoOfSteps'):
-                no_of_steps = line.split(":=")[-1].strip()
-            elif line.startswith('intRecipeQty'):
-                quantity = line.split(":=")[-1].strip()
-            elif line.startswith('intRecipeReworkStep'):
-                rework_step = line.split(":=")[-1].strip()
-        recipe = Recipe(description, no_of_steps, quantity, rework_step)
-        for step_number in range(1,recipe.no_of_steps+1):
+    An SQLite file in the Domaille directory holding the header and step
+    fields of every recipe with the stat signature of the files they were
+    parsed from. It is only ever a cache: an entry is used when its
+    signature still matches the files on disk, anything else is read from
+    the text files again. Deleting the index is always safe.
+    
+    Usage:
+        >>> domaille = Dommaile().read("E:/", index=True)
+        >>> LibraryIndex("E:/").clear()  # force a full read next time
+    """
+    FILENAME = 'index.sqlite'
+    VERSION = 1
+
+    def __init__(self, directory:str):
+        self.file = f"{directory}{os.sep}Domaille{os.sep}{LibraryIndex.FILENAME}"
+
+    def load(self) -> dict:
+        '''returns {name: (signature, header, steps)}, the signature is
+           kept as JSON text and steps is None for recipes indexed before
+           their steps were read. A missing,
+           outdated or unreadable index loads as empty'''
+        if not os.path.isfile(self.file):
+            return {}
+        try:
+            with closing(sqlite3.connect(self.file)) as db:
+                if db.execute('PRAGMA user_version').fetchone()[0] != LibraryIndex.VERSION:
+                    return {}
+                rows = db.execute('SELECT name, signature, header, steps FROM recipes')
+                return {name: (signature, json.loads(header),
+                               None if steps is None else json.loads(steps))
+                        for name, signature, header, steps in rows}
+        except (sqlite3.Error, ValueError) as e:
+            logger.warning(f"Ignoring recipe index {self.file}: {e}")
+            return {}
+
+    def save(self, recipes:'RecipeList', names:list = None, removed:list = ()):
+        '''stores the recipes read from disk, only the given names if any,
+           and drops the removed names'''
+        attrs = STEP_CODEC.attrs
+        if names is not None:
+            names = set(names)
+        rows = []
+        for recipe in recipes:
+            name = recipe._source[0] if recipe._source else None
+            if name not in recipes._signatures or (names is not None and name not in names):
+                continue
+            header = {attr: getattr(recipe, attr) for attr in RECIPE_CODEC.defaults}
+            steps = None
+            if recipe.loaded:
+                steps = json.dumps([[getattr(step, attr) for attr in attrs]
+                                    for step in recipe._shared_steps()])
+            rows.append((name, json.dumps(recipes._signatures[name]),
+                         json.dumps(header), steps))
+        try:
+            with closing(sqlite3.connect(self.file)) as db, db:
+                if db.execute('PRAGMA user_version').fetchone()[0] != LibraryIndex.VERSION:
+                    db.execute('DROP TABLE IF EXISTS recipes')
+                    db.execute('CREATE TABLE recipes (name TEXT PRIMARY KEY, '
+                               'signature TEXT, header TEXT, steps TEXT)')
+                    db.execute(f'PRAGMA user_version = {LibraryIndex.VERSION}')
+                if names is None:
+                    db.execute('DELETE FROM recipes')
+                db.executemany('DELETE FROM recipes WHERE name = ?',
+                               [(name,) for name in removed])
+                db.executemany('INSERT OR REPLACE INTO recipes VALUES (?, ?, ?, ?)', rows)
+        except sqlite3.Error as e:
+            logger.warning(f"Could not update recipe index {self.file}: {e}")
+
+    def clear(self):
+        '''deletes the index file'''
+        if os.path.isfile(self.file):
+            os.remove(self.file)
+
+
+class _Inotify():
+    '''minimal inotify binding, open() returns None where it is missing'''
+    MASK = (0x2 | 0x8 | 0x40 | 0x80 | 0x100 | 0x200 | 0x400 | 0x800)
+    IGNORED, OVERFLOW, ISDIR = 0x8000, 0x4000, 0x40000000
+    EVENT = struct.Struct('iIII')
+    # statfs f_type of file systems where inotify misses other clients'
+    # changes: NFS, SMB, CIFS, SMB2, AFS, Coda, Ceph, 9P and FUSE (sshfs...)
+    NETWORK = {0x6969, 0x517B, 0xFF534D42, 0xFE534D42, 0x5346414F,
+               0x73757245, 0x00C36400, 0x01021997, 0x65735546}
+
+    def __init__(self, libc, fd:int):
+        self._libc, self.fd = libc, fd
+        self.watches = {}   # wd: path
+
+    @staticmethod
+    def open() -> '_Inotify':
+        if not sys.platform.startswith('linux'):
+            return None
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        except (OSError, AttributeError, TypeError):
+            return None
+        return _Inotify(libc, fd) if fd >= 0 else None
+
+    def fileno(self) -> int:
+        return self.fd
+
+    def remote(self, path:str) -> bool:
+        '''True if path is on a network file system, see NETWORK'''
+        buffer = ctypes.create_string_buffer(256)   # struct statfs, f_type first
+        if self._libc.statfs(os.fsencode(path), buffer) != 0:
+            return False
+        f_type = ctypes.c_long.from_buffer(buffer).value & 0xFFFFFFFF
+        return f_type in _Inotify.NETWORK
+
+    def watch(self, path:str) -> bool:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), _Inotify.MASK)
+        if wd < 0:
+            return False
+        self.watches[wd] = path
+        return True
+
+    def read(self) -> list:
+        '''returns [(directory, mask, name)] for the pending events'''
+        events = []
+        while True:
             try:
-                file = f"{directory}{os.sep}Domaille{os.sep}Processes{os.sep}Steps{os.sep}{name}.{step_number:0>3}"
-                with open(file, 'r', encoding='ascii') as f:
-                    step = f.readlines()
-            except Exception as e:
-                print('ERROR', e)
-                print('File:', file)
-                print('this needs a better exception block, in some cases '
-                      'it should not be an issue and just pass through')
-                raise e    
-            for line in step:
-                if line.startswith('rRecipeStepTime '):
-                    time = line.split(":=")[-1].strip()
-                elif line.startswith('rRecipeStepSpeed '):
-                    speed = line.split(":=")[-1].strip()
-                elif line.startswith('rRecipeStepSpeedRamp '):
-                    speed_ramp = line.split(":=")[-1].strip()
-                elif line.startswith('rRecipeStepPressure '):
-                    pressure = line.split(":=")[-1].strip()
-                elif line.startswith('rRecipeStepPressureRamp '):
-                    pressure_ramp = line.split(":=")[-1].strip()
-                elif line.startswith('rRecipeStepFCI '):
-                    fci = line.split(":=")[-1].strip()
-                elif line.startswith('rRecipeStepLowerSpeedLimit '):
-                    lower_speed_limit = line.split(":=")[-1].strip()
-                elif line.startswith('rRecipeStepUpperSpeedLimit '):
-                    upper_speed_limit = line.split(":=")[-1].strip()
-                elif line.startswith('rRecipeStepLowerPressureLimit '):
-                    lower_pressure_limit = line.split(":=")[-1].strip()
-                elif line.startswith('rRecipeStepUpperPressureLimit '):
-                    upper_pressure_limit = line.split(":=")[-1].strip()
-                elif line.startswith('rRecipeStepFixtureWeight '):
-                    fixture_weight = line.split(":=")[-1].strip()
-                elif line.startswith('intRecipeStepOpCode '):
-                    op_code = line.split(":=")[-1].strip()
-                elif line.startswith('strRecipeStepFilm '):
-                    film = line.split(":=")[-1].strip()
-                elif line.startswith('strRecipeStepLubricant '):
-                    lubricant = line.split(":=")[-1].strip()
-                elif line.startswith('strRecipeStepPad '):
-                    pad = line.split(":=")[-1].strip()
-                elif line.startswith('strRecipeStepDescription1 '):
-                    description1 = line.split(":=")[-1].strip()
-                elif line.startswith('strRecipeStepDescription2 '):
-                    description2 = line.split(":=")[-1].strip()
-                elif line.startswith('rRecipeStepSpeedRampDn '):
-                    speed_ramp_dn = line.split(":=")[-1].strip()
-                elif line.startswith('rRecipeStepPressureRampDn '):
-                    pressure_ramp_dn = line.split(":=")[-1].strip()
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return events
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _Inotify.EVENT.unpack_from(data, offset)
+                offset += _Inotify.EVENT.size
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+                if mask & _Inotify.IGNORED:
+                    self.watches.pop(wd, None)
+                events.append((self.watches.get(wd), mask, os.fsdecode(name)))
+
+    def close(self):
+        os.close(self.fd)
+
+
+class LibraryWatcher():
+    """Watches a Domaille directory for recipe and settings changes.
+    
+    Uses inotify where it is available and polls the file signatures
+    every interval seconds elsewhere, and on network shares where
+    inotify does not see other clients' edits. The parent directory is
+    watched too, so a Domaille folder deleted and created again is
+    picked up; if the parent goes away the watcher switches to polling.
+    Bursts of events, like a recipe
+    write touching the header and every step file, are coalesced: the
+    tree is only scanned once it has been quiet for debounce seconds.
+    The callback is called from the watcher thread with a LibraryChange
+    naming the recipes added, modified and removed since the previous
+    call and whether Settings.txt changed; RecipeList.apply updates a
+    list from it.
+    
+    Usage:
+        >>> watcher = LibraryWatcher("E:/", print)
+        >>> watcher.backend
+        'inotify'
+        LibraryChange(added=['new'], modified=[], removed=[], settings=False, ...)
+        >>> watcher.stop()
+    """
+    def __init__(self, directory:str, callback, debounce:float = 0.25,
+                 interval:float = 2.0, polling:bool = False):
+        self.directory = directory
+        self.callback = callback
+        self.debounce, self.interval = debounce, interval
+        self._domaille_dir = f"{directory}{os.sep}Domaille"
+        self._process_dir = f"{self._domaille_dir}{os.sep}Processes"
+        self._recipes, self._settings = self._scan()
+        self._stopped = threading.Event()
+        self._inotify = None
+        if not polling:
+            self._inotify = _Inotify.open()
+        if self._inotify is not None and (self._inotify.remote(directory)
+                                          or not self._watch()):
+            self._inotify.close()
+            self._inotify = None
+        self.backend = 'polling' if self._inotify is None else 'inotify'
+        if self._inotify is not None:
+            self._wake_r, self._wake_w = os.pipe()
+        self._thread = threading.Thread(target=self._run, name='LibraryWatcher',
+                                         daemon=True)
+        self._thread.start()
+        logger.debug(f"Watching {self._domaille_dir} ({self.backend})")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def running(self) -> bool:
+        return self._thread.is_alive()
+
+    def stop(self):
+        '''stops the watcher thread, pending events are dropped'''
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        if self._inotify is not None:
+            os.write(self._wake_w, b'\0')
+        if threading.current_thread() is not self._thread:
+            self._thread.join()
+        if self._inotify is not None:
+            self._inotify.close()
+            os.close(self._wake_r)
+            os.close(self._wake_w)
+
+    def _watch(self) -> bool:
+        '''(re)adds the watches, False if the directories are missing'''
+        return all(self._inotify.watch(path) for path in (
+            self.directory, self._domaille_dir, self._process_dir,
+            f"{self._process_dir}{os.sep}Steps")
+            if os.path.isdir(path) or path in (self.directory, self._domaille_dir))
+
+    def _scan(self) -> tuple:
+        '''returns the recipe signatures and the Settings.txt stat'''
+        try:
+            stat = os.stat(f"{self._domaille_dir}{os.sep}Settings.txt")
+            settings = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        except OSError:
+            settings = None
+        try:
+            recipes = RecipeList._scan(self.directory)
+        except OSError:
+            recipes = {}
+        return recipes, settings
+
+    def _run(self):
+        try:
+            if self._inotify is None:
+                self._poll()
+            else:
+                self._listen()
+        except Exception:
+            logger.exception(f"LibraryWatcher of {self._domaille_dir} stopped")
+
+    def _poll(self):
+        while not self._stopped.wait(self.interval):
+            current = self._scan()
+            if current == (self._recipes, self._settings):
+                continue
+            # wait until the tree settles
+            while not self._stopped.wait(self.debounce):
+                latest = self._scan()
+                if latest == current:
+                    break
+                current = latest
+            else:
+                return
+            self._emit(*current)
+
+    def _listen(self):
+        inotify, wake = self._inotify, self._wake_r
+        while True:
+            ready, _, _ = select.select([inotify, wake], [], [])
+            if wake in ready:
+                return
+            if not self._relevant(inotify.read()):
+                continue
+            # coalesce the burst
+            while True:
+                ready, _, _ = select.select([inotify, wake], [], [], self.debounce)
+                if wake in ready:
+                    return
+                if not ready:
+                    break
+                self._relevant(inotify.read())
+            self._emit(*self._scan())
+            if self.directory not in inotify.watches.values():
+                # nothing left to see Domaille come back through
+                logger.info(f"{self.directory} is gone, polling {self._domaille_dir}")
+                self.backend = 'polling'
+                return self._poll()
+
+    def _relevant(self, events:list) -> bool:
+        '''True if the events can change the recipes or settings, re-adds
+           the watches of directories that were deleted and created again'''
+        relevant = False
+        for directory, mask, name in events:
+            if directory == self.directory:
+                # the parent: only Domaille itself coming and going matters
+                if name == 'Domaille' or mask & _Inotify.IGNORED:
+                    relevant = True
+                    self._watch()
+                continue
+            if mask & _Inotify.OVERFLOW:
+                relevant = True
+            elif directory == self._domaille_dir or directory is None:
+                if name == 'Settings.txt' or mask & _Inotify.ISDIR:
+                    relevant = True
+            else:
+                relevant = True
+            if mask & (_Inotify.ISDIR | _Inotify.IGNORED):
+                self._watch()
+        return relevant
+
+    def _emit(self, recipes:dict, settings:tuple):
+        previous = self._recipes
+        added = sorted(recipes.keys() - previous.keys())
+        removed = sorted(previous.keys() - recipes.keys())
+        modified = sorted(name for name in recipes.keys() & previous.keys()
+                          if recipes[name] != previous[name])
+        changed = settings != self._settings
+        self._recipes, self._settings = recipes, settings
+        if not (added or modified or removed or changed):
+            return
+        change = LibraryChange(added, modified, removed, changed,
+                               {name: recipes[name] for name in added + modified})
+        logger.debug(f"{self._domaille_dir}: {len(added)} added, {len(modified)} "
+                     f"modified, {len(removed)} removed, settings {changed}")
+        try:
+            self.callback(change)
+        except Exception:
+            logger.exception("LibraryWatcher callback failed")
+
+
+class SearchIndex():
+    """In-memory inverted index over the recipes of a RecipeList.
+    
+    Indexes the words and whole values of the recipe description and the
+    film, pad, lubricant, description1 and description2 of every step,
+    and the time, pressure and speed of every step by value for range
+    queries. A query is a list of terms that must all match:
+    
+        word            any text field holds the word
+        "two words"     any text field holds exactly this value
+        film:purple     the field holds the word (or value when quoted)
+        pad:75*         prefix of a word or value
+        time:30..60     some step's time in range, either end may be left
+                        out; time:60 matches exactly
+    
+    Matching ignores case. Steps of lazy recipes are read when indexed.
+    RecipeList keeps its index up to date; a recipe edited in place is
+    indexed again when it is written or passed to add().
+    
+    Usage:
+        >>> recipes = RecipeList("E:/")
+        >>> recipes.search('film:"Purple 1um" pad:"75 Duro Brown"')
+        [<Recipe(Final polish, 3 steps, 32 qty)>]
+        >>> recipes.search("PN-1234", time=(None, 60))
+        []
+    """
+    TEXT = ('description', 'film', 'pad', 'lubricant', 'description1', 'description2')
+    RANGES = ('time', 'pressure', 'speed')
+    _STEP_TEXT = TEXT[1:]
+    _PUNCTUATION = ',;:()[]{}"\'!?'
+
+    def __init__(self, recipes:list = ()):
+        self._postings = {field: {} for field in SearchIndex.TEXT}  # field: {term: {doc}}
+        self._vocabulary = dict.fromkeys(SearchIndex.TEXT)  # sorted terms, None when stale
+        self._values = {field: {} for field in SearchIndex.RANGES}  # field: {value: {doc}}
+        self._keys = dict.fromkeys(SearchIndex.RANGES)  # sorted values, None when stale
+        self._docs = {}      # doc: recipe
+        self._doc_ids = {}   # id(recipe): doc
+        self._entries = {}   # doc: (terms, values) to remove it again
+        self._next = 0
+        self._terms_cache = {}
+        self.add(recipes)
+
+    def __len__(self):
+        return len(self._docs)
+
+    def __repr__(self):
+        terms = sum(len(postings) for postings in self._postings.values())
+        return f"<SearchIndex({len(self)} recipes, {terms} terms)>"
+
+    def clear(self):
+        self.__init__()
+
+    def add(self, recipes:list):
+        '''indexes the recipes, again if they were indexed before'''
+        for recipe in recipes:
+            self._add(recipe)
+
+    def remove(self, recipes:list):
+        '''drops the recipes from the index, unknown ones are ignored'''
+        for recipe in recipes:
+            self._remove(recipe)
+
+    def _terms(self, value) -> tuple:
+        '''the words of a text value plus the whole value'''
+        terms = self._terms_cache.get(value)
+        if terms is None:
+            words = [word.strip(SearchIndex._PUNCTUATION)
+                     for word in str(value).lower().split()]
+            words = [word for word in words if word]
+            whole = ' '.join(words)
+            terms = tuple(words) if len(words) < 2 else (*words, whole)
+            if len(self._terms_cache) < 65536:
+                self._terms_cache[value] = terms
+        return terms
+
+    def _add(self, recipe:'Recipe'):
+        if id(recipe) in self._doc_ids:
+            self._remove(recipe)
+        doc = self._next
+        self._next += 1
+        terms = {('description', term) for term in self._terms(recipe.description)}
+        values = set()
+        for step in recipe._shared_steps():
+            if step is None:
+                continue
+            for field in SearchIndex._STEP_TEXT:
+                for term in self._terms(getattr(step, field)):
+                    terms.add((field, term))
+            for field in SearchIndex.RANGES:
+                values.add((field, getattr(step, field)))
+
+        for field, term in terms:
+            docs = self._postings[field].get(term)
+            if docs is None:
+                self._postings[field][term] = {doc}
+                self._vocabulary[field] = None
+            else:
+                docs.add(doc)
+        for field, value in values:
+            docs = self._values[field].get(value)
+            if docs is None:
+                self._values[field][value] = {doc}
+                self._keys[field] = None
+            else:
+                docs.add(doc)
+        self._docs[doc] = recipe
+        self._doc_ids[id(recipe)] = doc
+        self._entries[doc] = (terms, values)
+
+    def _remove(self, recipe:'Recipe'):
+        doc = self._doc_ids.pop(id(recipe), None)
+        if doc is None:
+            return
+        del self._docs[doc]
+        terms, values = self._entries.pop(doc)
+        for field, term in terms:
+            docs = self._postings[field][term]
+            docs.discard(doc)
+            if not docs:
+                del self._postings[field][term]
+                self._vocabulary[field] = None
+        for field, value in values:
+            docs = self._values[field][value]
+            docs.discard(doc)
+            if not docs:
+                del self._values[field][value]
+                self._keys[field] = None
+
+    def search(self, query:str = '', **fields) -> list:
+        """Find the recipes matching every term.
+        
+        Args:
+            query (str): Terms separated by spaces, see the class docs
+            **fields: More terms by field name, a str matches like a
+                quoted value and a (low, high) tuple is a range
+            
+        Returns:
+            list: The matching recipes in the order they were indexed
+            
+        Usage:
+            >>> index.search("purple* pressure:..12")
+            >>> index.search(film="Purple 1um", time=(30, 60))
+        """
+        terms = []
+        for term in shlex.split(query):
+            field, sep, value = term.partition(':')
+            if sep and field in SearchIndex.RANGES:
+                low, dots, high = value.partition('..')
+                low, high = (_real(low) if low else None,
+                             _real(high) if high else None)
+                terms.append((field, (low, high) if dots else (low, low)))
+            elif sep and field in SearchIndex.TEXT:
+                terms.append((field, value))
+            else:
+                terms.append((None, term))
+        for field, value in fields.items():
+            if field not in SearchIndex.TEXT and field not in SearchIndex.RANGES:
+                raise ValueError(f"Unknown search field: {field}")
+            terms.append((field, value))
+
+        docs = None
+        # ranges last, by then the few candidates left are checked directly
+        for field, value in sorted(terms, key=lambda term: term[0] in SearchIndex.RANGES):
+            if field in SearchIndex.RANGES:
+                if docs is not None and len(docs) < 256:
+                    docs = self._in_range(docs, field, *value)
+                    matched = docs
                 else:
-                    print(f"Unknown setting in {step}:") 
-                    print(line)
-
-            recipe[step_number] = RecipeStep(time, pressure)
-            recipe[step_number].time = time
-            recipe[step_number].speed = speed
-            recipe[step_number].speed_ramp = speed_ramp
-            recipe[step_number].pressure = pressure
-            recipe[step_number].pressure_ramp = pressure_ramp
-            recipe[step_number].fci = fci
-            recipe[step_number].lower_speed_limit = lower_speed_limit
-            recipe[step_number].upper_speed_limit = upper_speed_limit
-            recipe[step_number].lower_pressure_limit = lower_pressure_limit
-            recipe[step_number].upper_pressure_limit = upper_pressure_limit
-            recipe[step_number].fixture_weight = fixture_weight
-            recipe[step_number].op_code = op_code
-            recipe[step_number].film = film
-            recipe[step_number].lubricant = lubricant
-            recipe[step_number].pad = pad
-            recipe[step_number].description1 = description1
-            recipe[step_number].description2 = description2
-            recipe[step_number].speed_ramp_dn = speed_ramp_dn
-            recipe[step_number].pressure_ramp_dn = pressure_ramp_dn
-        return recipe
+                    matched = self._range(field, *value)
+            else:
+                matched = self._match(field, value)
+            docs = matched if docs is None else docs & matched
+            if not docs:
+                return []
+        if docs is None:
+            docs = self._docs
+        return [self._docs[doc] for doc in sorted(docs)]
+
+    def _match(self, field:str, value:str) -> set:
+        '''docs whose field, or any text field, holds value'''
+        prefix = value.endswith('*')
+        words = self._terms(value.rstrip('*') if prefix else value)
+        if not words:
+            return set(self._docs) if prefix else set()
+        term = words[-1]   # the word, or the whole value
+        matched = set()
+        for name in (field,) if field else SearchIndex.TEXT:
+            if prefix:
+                matched.update(*self._prefixed(name, term))
+            else:
+                matched.update(self._postings[name].get(term, ()))
+        return matched
+
+    def _prefixed(self, field:str, prefix:str) -> list:
+        '''the doc sets of every term of field starting with prefix'''
+        vocabulary = self._vocabulary[field]
+        if vocabulary is None:
+            vocabulary = self._vocabulary[field] = sorted(self._postings[field])
+        postings = self._postings[field]
+        start = bisect.bisect_left(vocabulary, prefix)
+        stop = bisect.bisect_left(vocabulary, prefix + '\uffff', start)
+        return [postings[term] for term in vocabulary[start:stop]]
+
+    def _in_range(self, docs:set, field:str, low=None, high=None) -> set:
+        '''the docs of docs with a step whose field is within [low, high]'''
+        return {doc for doc in docs if any(
+            name == field and (low is None or value >= low) and (high is None or value <= high)
+            for name, value in self._entries[doc][1])}
+
+    def _range(self, field:str, low=None, high=None) -> set:
+        '''docs with a step whose field is within [low, high]'''
+        keys = self._keys[field]
+        if keys is None:
+            keys = self._keys[field] = sorted(self._values[field])
+        start = 0 if low is None else bisect.bisect_left(keys, low)
+        stop = len(keys) if high is None else bisect.bisect_right(keys, high, start)
+        values = self._values[field]
+        return set().union(*(values[key] for key in keys[start:stop]))
+
+
+def _packed(fields:tuple) -> str:
+    '''the struct codes of a codec's fields, see Snapshot'''
+    return ''.join({str: 'I', int: 'q', _real: 'd'}[field.type] for field in fields)
+
+
+class Snapshot():
+    """Binary snapshot of a whole Dommaile: settings, recipes and steps.
+    
+    Layout, little endian:
+        header    magic, version, layout checksum, then the string, recipe
+                  and step counts and the size of the string text
+        strings   the end offset of every string, then their UTF-8 text
+        settings  max quantity, film, pad and lubricant counts and ids
+        recipes   the RECIPE_CODEC fields and step count of every recipe
+        steps     the STEP_CODEC fields of every step, in recipe order
+    
+    Every string is stored once and referenced by its index. REAL fields
+    are doubles, with a bit per field marking the whole numbers, so the
+    native files format back byte for byte. A snapshot is read with one
+    read, or mapped with mmap, and unpacked with struct.iter_unpack.
+    
+    Usage:
+        >>> Snapshot.save(domaille, "library.dsnap")
+        >>> copy = Snapshot.load("library.dsnap", intern=True)
+        >>> copy.write("E:/", force=True)  # a native tree again
+    """
+    MAGIC = b'DOMSNAP\0'
+    VERSION = 1
+    HEADER = struct.Struct('<8sIIIIII')
+    SETTINGS = struct.Struct('<qIII')
+    RECIPE = struct.Struct(f'<{_packed(RECIPE_CODEC.fields)}I')
+    STEP = struct.Struct(f'<I{_packed(STEP_CODEC.fields)}')
+    # changes whenever a codec gains, loses or reorders a field
+    LAYOUT = zlib.crc32(' '.join((RECIPE.format, STEP.format, *RECIPE_CODEC.attrs,
+                                  *STEP_CODEC.attrs)).encode())
+
+    @staticmethod
+    def save(domaille:'Dommaile', file:str) -> int:
+        '''writes the snapshot, replacing file only once it is complete,
+           returns its size in bytes'''
+        strings = {}
+        def string(value:str) -> int:
+            index = strings.get(value)
+            if index is None:
+                index = strings[value] = len(strings)
+            return index
+
+        settings = domaille.settings
+        lists = (settings.film, settings.pad, settings.lubricant)
+        settings_ids = [string(value) for values in lists for value in values]
+        recipe_fields = [(field.attr, field.type is str) for field in RECIPE_CODEC.fields]
+        step_fields = [(field.attr, field.type) for field in STEP_CODEC.fields]
+        recipes, steps = [], []
+        for recipe in domaille.recipes:
+            recipe_steps = [step for step in recipe._shared_steps() if step is not None]
+            recipes.append(Snapshot.RECIPE.pack(
+                *(string(getattr(recipe, attr)) if is_str else getattr(recipe, attr)
+                  for attr, is_str in recipe_fields), len(recipe_steps)))
+            for step in recipe_steps:
+                mask, values = 0, []
+                for bit, (attr, kind) in enumerate(step_fields):
+                    value = getattr(step, attr)
+                    if kind is str:
+                        value = string(value)
+                    elif kind is _real and type(value) is int:
+                        mask |= 1 << bit
+                    values.append(value)
+                steps.append(Snapshot.STEP.pack(mask, *values))
+
+        text = ''.join(strings)
+        ends, end = [], 0
+        for value in strings:
+            end += len(value)
+            ends.append(end)
+        data = text.encode()
+        parts = [Snapshot.HEADER.pack(Snapshot.MAGIC, Snapshot.VERSION, Snapshot.LAYOUT,
+                                      len(strings), len(recipes), len(steps), len(data)),
+                 struct.pack(f'<{len(ends)}I', *ends), data,
+                 Snapshot.SETTINGS.pack(settings.max_quantity, *map(len, lists)),
+                 struct.pack(f'<{len(settings_ids)}I', *settings_ids),
+                 *recipes, *steps]
+        temporary = f"{file}.tmp"
+        with open(temporary, 'wb') as f:
+            for part in parts:
+                f.write(part)
+            size = f.tell()
+        os.replace(temporary, file)
+        logger.info(f"Snapshot of {len(recipes)} recipes written to {file}")
+        return size
+
+    @staticmethod
+    def load(file:str, use_mmap:bool = False, intern:bool = False) -> 'Dommaile':
+        '''reads a snapshot into a new Dommaile whose recipes are unsaved,
+           intern shares identical steps like Recipe.read'''
+        with open(file, 'rb') as f:
+            if use_mmap:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    return Snapshot._unpack(data, intern)
+            return Snapshot._unpack(f.read(), intern)
+
+    @staticmethod
+    def _unpack(data, intern:bool) -> 'Dommaile':
+        if len(data) < Snapshot.HEADER.size:
+            raise ValueError("Not a Domaille snapshot")
+        (magic, version, layout, n_strings, n_recipes, n_steps,
+         text_size) = Snapshot.HEADER.unpack_from(data, 0)
+        if magic != Snapshot.MAGIC:
+            raise ValueError("Not a Domaille snapshot")
+        if version != Snapshot.VERSION or layout != Snapshot.LAYOUT:
+            raise ValueError(f"Unsupported snapshot version {version}")
+        offset = Snapshot.HEADER.size
+        ends = struct.unpack_from(f'<{n_strings}I', data, offset)
+        offset += 4 * n_strings
+        text = data[offset:offset + text_size].decode()
+        offset += text_size
+        strings = [text[start:end] for start, end in zip((0, *ends), ends)]
+
+        max_quantity, *counts = Snapshot.SETTINGS.unpack_from(data, offset)
+        offset += Snapshot.SETTINGS.size
+        ids = struct.unpack_from(f'<{sum(counts)}I', data, offset)
+        offset += 4 * sum(counts)
+        names = [strings[index] for index in ids]
+        film, pad = counts[0], counts[0] + counts[1]
+        settings = Settings(max_quantity, names[:film], names[film:pad], names[pad:])
+
+        size = Snapshot.RECIPE.size * n_recipes
+        recipe_rows = Snapshot.RECIPE.iter_unpack(data[offset:offset + size])
+        offset += size
+        step_rows = Snapshot.STEP.iter_unpack(data[offset:offset + Snapshot.STEP.size * n_steps])
+
+        texts = [bit for bit, field in enumerate(STEP_CODEC.fields) if field.type is str]
+        reals = [bit for bit, field in enumerate(STEP_CODEC.fields) if field.type is _real]
+        header_texts = [index for index, field in enumerate(RECIPE_CODEC.fields)
+                        if field.type is str]
+        whole = {}      # mask: the REAL fields it marks as whole numbers
+        parsed = {}     # row: values, or the shared step with intern
+        recipes = RecipeList()
+        for row in recipe_rows:
+            *header, count = row
+            for index in header_texts:
+                header[index] = strings[header[index]]
+            steps = []
+            for step_row in itertools.islice(step_rows, count):
+                step = parsed.get(step_row)
+                if step is None:
+                    mask, *values = step_row
+                    for bit in texts:
+                        values[bit] = strings[values[bit]]
+                    bits = whole.get(mask)
+                    if bits is None:
+                        bits = whole[mask] = [bit for bit in reals if mask >> bit & 1]
+                    for bit in bits:
+                        values[bit] = int(values[bit])
+                    step = parsed[step_row] = RecipeStep._new(values, True) if intern else values
+                steps.append(step if intern else RecipeStep._new(step))
+            recipe = Recipe(*header, *steps)
+            recipe._intern = intern
+            recipes.append(recipe)
+
+        domaille = Dommaile(settings=settings)
+        domaille.recipes = recipes
+        return domaille
+
+
+class Storage(abc.ABC):
+    """Where a whole Dommaile library is kept.
+    
+    A backend reads a library into a new Dommaile and writes one back,
+    so the same code can work on the native Domaille directory tree the
+    polisher reads or on a master library kept elsewhere. Subclasses
+    must implement read and write, a backend missing either cannot be
+    created.
+    
+    Usage:
+        >>> master = SQLiteStorage("master.sqlite")
+        >>> master.import_tree("E:/")  # take in a flash drive
+        >>> domaille = Dommaile.load(master)
+        >>> master.export_tree("F:/")  # project the library onto another
+    """
+    @abc.abstractmethod
+    def read(self) -> 'Dommaile':
+        '''returns a new Dommaile holding the stored library'''
+
+    @abc.abstractmethod
+    def write(self, domaille:'Dommaile', force:bool = False) -> int:
+        '''stores the settings and the recipes that changed since they
+           were read or written, every recipe with force, returns the
+           number of recipes written'''
+
+
+def _unreadable(directory:str, errors:list) -> str:
+    '''the message for recipes of directory that failed to load'''
+    return (f"{len(errors)} recipes in {directory} cannot be read: "
+            + ', '.join(f"{name} ({error})" for name, error in errors))
+
+
+class TreeStorage(Storage):
+    """The native Domaille/Processes directory tree, see Dommaile.read.
+    
+    Usage:
+        >>> drive = TreeStorage("E:/", workers=8)
+        >>> drive.write(Dommaile.load(master), force=True)
+    """
+    def __init__(self, directory:str, workers:int = None):
+        self.directory = directory
+        self.workers = workers
+
+    def read(self) -> 'Dommaile':
+        '''raises ValueError if any recipe cannot be read, a partial
+           library would drop it from wherever it is saved next'''
+        domaille = Dommaile(path=self.directory).read(self.directory, self.workers)
+        if domaille is not None and domaille.recipes.errors:
+            raise ValueError(_unreadable(self.directory, domaille.recipes.errors))
+        return domaille
+
+    def write(self, domaille:'Dommaile', force:bool = False) -> int:
+        count = len(domaille.recipes._unwritten(self.directory, force))
+        domaille.write(self.directory, force)
+        return count
+
+
+class SQLiteStorage(Storage):
+    """Recipe library kept in one SQLite database.
+    
+    Tables:
+        settings  (name, position, value) for the max quantity and the
+                  film, pad and lubricant lists
+        recipes   the RECIPE_CODEC fields, unique by description, with a
+                  revision counted up on every write and the time of it
+        steps     the STEP_CODEC fields of every step by (recipe, number),
+                  indexed on film, pad and lubricant
+    
+    The columns follow the codecs. REAL fields are stored untyped so
+    whole numbers stay integers and the native files format back byte
+    for byte. Every write is one transaction: a failed import or save
+    leaves the database as it was. Unlike the LibraryIndex this is a
+    library of its own, export_tree projects it onto a Domaille tree.
+    
+    Usage:
+        >>> master = SQLiteStorage("master.sqlite")
+        >>> master.import_tree("E:/")
+        2000
+        >>> master.find(film='Purple 1um', time=(30, 60))
+        ['LC-APC 2', 'SC-APC 1']
+        >>> master.export_tree("F:/", names=master.names("LC-*"))
+        412
+    """
+    VERSION = 1
+    SETTINGS = ('film', 'pad', 'lubricant')
+    INDEXED = ('film', 'pad', 'lubricant')
+
+    def __init__(self, file:str):
+        self.file = file
+
+    def _connect(self) -> sqlite3.Connection:
+        '''opens the database, creating the tables on first use'''
+        db = sqlite3.connect(self.file)
+        try:
+            version = db.execute('PRAGMA user_version').fetchone()[0]
+            if version == 0:
+                with db:
+                    SQLiteStorage._create(db)
+            elif version != SQLiteStorage.VERSION:
+                raise ValueError(f"Unsupported library version {version} in {self.file}")
+            db.execute('PRAGMA foreign_keys = ON')
+            db.execute('PRAGMA journal_mode = WAL')
+            db.execute('PRAGMA synchronous = NORMAL')
+        except BaseException:
+            db.close()
+            raise
+        return db
+
+    @staticmethod
+    def _create(db:sqlite3.Connection):
+        types = {str: 'TEXT NOT NULL', int: 'INTEGER NOT NULL', _real: 'NOT NULL'}
+        columns = lambda codec: ', '.join(f'"{field.attr}" {types[field.type]}'
+                                          for field in codec.fields)
+        db.execute('CREATE TABLE settings (name TEXT NOT NULL, position INTEGER NOT NULL, '
+                   'value NOT NULL, PRIMARY KEY (name, position)) WITHOUT ROWID')
+        db.execute(f'CREATE TABLE recipes (id INTEGER PRIMARY KEY, {columns(RECIPE_CODEC)}, '
+                   f'revision INTEGER NOT NULL DEFAULT 1, modified REAL, '
+                   f'UNIQUE (description))')
+        db.execute(f'CREATE TABLE steps (recipe INTEGER NOT NULL '
+                   f'REFERENCES recipes (id) ON DELETE CASCADE, '
+                   f'number INTEGER NOT NULL, {columns(STEP_CODEC)}, '
+                   f'PRIMARY KEY (recipe, number)) WITHOUT ROWID')
+        for attr in SQLiteStorage.INDEXED:
+            db.execute(f'CREATE INDEX steps_{attr} ON steps ("{attr}")')
+        db.execute(f'PRAGMA user_version = {SQLiteStorage.VERSION}')
+
+    def read(self, names:list = None) -> 'Dommaile':
+        '''returns a new Dommaile with the stored settings and recipes,
+           only the named recipes if names is given'''
+        with closing(self._connect()) as db:
+            settings = SQLiteStorage._read_settings(db)
+            recipes = RecipeList(list(self._read_recipes(db, names)))
+        domaille = Dommaile(settings=settings)
+        domaille.recipes = recipes
+        return domaille
+
+    def read_recipes(self, names:list = None) -> 'RecipeList':
+        '''returns the stored recipes, only the named ones if given'''
+        with closing(self._connect()) as db:
+            return RecipeList(list(self._read_recipes(db, names)))
+
+    @staticmethod
+    def _read_settings(db:sqlite3.Connection) -> 'Settings':
+        rows = db.execute('SELECT name, value FROM settings ORDER BY name, position')
+        values = {name: [value for _, value in group]
+                  for name, group in itertools.groupby(rows, key=lambda row: row[0])}
+        if not values:
+            return Settings.default()
+        return Settings(values.get('max_quantity', [32])[0],
+                        *(values.get(name, []) for name in SQLiteStorage.SETTINGS))
+
+    def _read_recipes(self, db:sqlite3.Connection, names:list = None):
+        '''yields the recipes in the order they were first stored,
+           merging one ordered query over recipes with one over steps so
+           memory stays flat. Recipes are clean but not from any
+           directory, so every tree they are written to gets them'''
+        header = ', '.join(f'r."{attr}"' for attr in RECIPE_CODEC.attrs)
+        fields = ', '.join(f's."{attr}"' for attr in STEP_CODEC.attrs)
+        wanted = ''
+        if names is not None:
+            db.execute('CREATE TEMP TABLE IF NOT EXISTS wanted (name TEXT PRIMARY KEY)')
+            db.execute('DELETE FROM wanted')
+            db.executemany('INSERT OR IGNORE INTO wanted VALUES (?)',
+                           [(name,) for name in names])
+            wanted = 'JOIN wanted w ON w.name = r.description'
+        recipes = db.execute(f'SELECT r.id, {header} FROM recipes r {wanted} ORDER BY r.id')
+        steps = db.execute(f'SELECT s.recipe, {fields} FROM steps s '
+                           f'JOIN recipes r ON r.id = s.recipe {wanted} '
+                           f'ORDER BY s.recipe, s.number')
+        groups = itertools.groupby(steps, key=itemgetter(0))
+        group = next(groups, None)
+        for recipe_id, *values in recipes:
+            recipe_steps = []
+            if group is not None and group[0] == recipe_id:
+                recipe_steps = [RecipeStep._new(row[1:]) for row in group[1]]
+                group = next(groups, None)
+            recipe = Recipe._build(values[0], None, dict(zip(RECIPE_CODEC.attrs, values)),
+                                   recipe_steps)
+            recipe._source = None
+            yield recipe
+
+    def write(self, domaille:'Dommaile', force:bool = False) -> int:
+        '''stores the settings and, in the same transaction, the recipes
+           that changed or are not stored yet, every recipe with force'''
+        with closing(self._connect()) as db, db:
+            SQLiteStorage._write_settings(db, domaille.settings)
+            stored = {name for name, in db.execute('SELECT description FROM recipes')}
+            recipes = [recipe for recipe in domaille.recipes
+                       if force or recipe.dirty or recipe.description not in stored]
+            count = SQLiteStorage._write_recipes(db, recipes)
+        for recipe in recipes:
+            if recipe._source is None:
+                recipe._mark_clean()
+        logger.info(f"{count} recipes written to {self.file}")
+        return count
+
+    def write_recipes(self, recipes) -> int:
+        '''stores any number of recipes in one transaction, replacing
+           the steps of the ones already stored, returns the count'''
+        with closing(self._connect()) as db, db:
+            return SQLiteStorage._write_recipes(db, recipes)
+
+    @staticmethod
+    def _write_settings(db:sqlite3.Connection, settings:'Settings'):
+        db.execute('DELETE FROM settings')
+        rows = [('max_quantity', 0, settings.max_quantity)]
+        for name in SQLiteStorage.SETTINGS:
+            rows.extend((name, position, value)
+                        for position, value in enumerate(getattr(settings, name)))
+        db.executemany('INSERT INTO settings VALUES (?, ?, ?)', rows)
+
+    @staticmethod
+    def _write_recipes(db:sqlite3.Connection, recipes) -> int:
+        '''upserts the recipes in batches, counting up the revision of
+           the ones already stored'''
+        attrs = RECIPE_CODEC.attrs
+        columns = ', '.join(f'"{attr}"' for attr in attrs)
+        updates = ', '.join(f'"{attr}" = excluded."{attr}"' for attr in attrs[1:])
+        upsert = (f'INSERT INTO recipes ({columns}, modified) '
+                  f'VALUES ({", ".join("?" * (len(attrs) + 1))}) '
+                  f'ON CONFLICT (description) DO UPDATE SET {updates}, '
+                  f'revision = revision + 1, modified = excluded.modified')
+        insert = (f'INSERT INTO steps VALUES '
+                  f'({", ".join("?" * (len(STEP_CODEC.attrs) + 2))})')
+        header = attrgetter(*attrs)
+        fields = attrgetter(*STEP_CODEC.attrs)
+        count = 0
+        recipes = iter(recipes)
+        while chunk := list(itertools.islice(recipes, 256)):
+            now = time.time()
+            db.executemany(upsert, [(*header(recipe), now) for recipe in chunk])
+            descriptions = [(recipe.description,) for recipe in chunk]
+            db.executemany('DELETE FROM steps WHERE recipe = '
+                           '(SELECT id FROM recipes WHERE description = ?)', descriptions)
+            ids = [db.execute('SELECT id FROM recipes WHERE description = ?',
+                              description).fetchone()[0] for description in descriptions]
+            db.executemany(insert, [(recipe_id, number, *fields(step))
+                                    for recipe_id, recipe in zip(ids, chunk)
+                                    for number, step in enumerate(
+                                        (step for step in recipe._shared_steps()
+                                         if step is not None), 1)])
+            count += len(chunk)
+        return count
+
+    def delete(self, names:list) -> int:
+        '''removes the named recipes and their steps, returns how many
+           were stored'''
+        with closing(self._connect()) as db, db:
+            return db.executemany('DELETE FROM recipes WHERE description = ?',
+                                  [(name,) for name in names]).rowcount
+
+    def names(self, pattern:str = None) -> list:
+        '''returns the stored recipe names, only the ones matching the
+           shell-style pattern if given'''
+        with closing(self._connect()) as db:
+            if pattern is None:
+                rows = db.execute('SELECT description FROM recipes ORDER BY description')
+            else:
+                rows = db.execute('SELECT description FROM recipes WHERE description GLOB ? '
+                                  'ORDER BY description', (pattern,))
+            return [name for name, in rows]
+
+    def revisions(self) -> dict:
+        '''returns {name: (revision, modified)} of every stored recipe'''
+        with closing(self._connect()) as db:
+            return {name: (revision, modified) for name, revision, modified
+                    in db.execute('SELECT description, revision, modified FROM recipes')}
+
+    def find(self, **fields) -> list:
+        '''returns the names of the recipes matching every given header
+           field and with one step matching every given step field. A
+           (low, high) tuple matches a range, open at a None end; film,
+           pad and lubricant are indexed'''
+        clauses, params, join = [], [], False
+        for field, value in fields.items():
+            if field in RECIPE_CODEC.defaults:
+                column = f'r."{field}"'
+            elif field in STEP_CODEC.defaults:
+                column, join = f's."{field}"', True
+            else:
+                raise ValueError(f"Unknown search field: {field}")
+            if isinstance(value, tuple):
+                # a None end is open, like SearchIndex.search
+                low, high = value
+                if low is not None:
+                    clauses.append(f'{column} >= ?')
+                    params.append(low)
+                if high is not None:
+                    clauses.append(f'{column} <= ?')
+                    params.append(high)
+            else:
+                clauses.append(f'{column} = ?')
+                params.append(value)
+        query = 'SELECT DISTINCT r.description FROM recipes r'
+        if join:
+            query += ' JOIN steps s ON s.recipe = r.id'
+        if clauses:
+            query += ' WHERE ' + ' AND '.join(clauses)
+        with closing(self._connect()) as db:
+            return [name for name, in db.execute(query + ' ORDER BY r.description', params)]
+
+    def import_tree(self, directory:str, workers:int = 8, replace:bool = False) -> int:
+        '''stores the settings and every recipe of a Domaille tree in one
+           transaction, replace also drops the recipes not in the tree.
+           Recipes that cannot be read are logged and keep their stored
+           version; with replace nothing is imported and ValueError is
+           raised instead. Returns the number of recipes stored'''
+        settings = Settings.read(directory)
+        if settings is None:
+            raise ValueError(f"No Domaille library in {directory}")
+        recipes = RecipeList().read(directory, workers)
+        if recipes.errors:
+            if replace:
+                raise ValueError(_unreadable(directory, recipes.errors))
+            logger.warning(_unreadable(directory, recipes.errors))
+        with closing(self._connect()) as db, db:
+            SQLiteStorage._write_settings(db, settings)
+            if replace:
+                db.execute('DELETE FROM recipes')
+            count = SQLiteStorage._write_recipes(db, recipes)
+        logger.info(f"{count} recipes imported from {directory} into {self.file}")
+        return count
+
+    def export_tree(self, directory:str, workers:int = 8, names:list = None) -> int:
+        '''writes the settings and the stored recipes, only the named
+           ones if given, as a Domaille tree. Recipes stream from the
+           database into RecipeList.write_all, returns the count'''
+        with closing(self._connect()) as db:
+            settings = SQLiteStorage._read_settings(db)
+            Path.write(directory)
+            settings.write(directory)
+            return RecipeList.write_all(self._read_recipes(db, names), directory, workers)
+
+
+class RecipeColumns():
+    """Column-oriented NumPy view of a RecipeList.
+    
+    ``steps`` holds one array per RecipeStep field with one row per step,
+    plus ``recipe`` (row in ``recipes``) and ``step`` (1-based step number).
+    Film, pad and lubricant are stored as integer codes into
+    ``categories``. REAL fields are float arrays, ``whole`` marks the
+    values that were whole numbers so they format back the same. ``recipes``
+    holds one array per header field with one row per recipe, plus
+    ``name``, the file name it was read from.
+    
+    Usage:
+        >>> columns = domaille.recipes.to_columns(domaille.settings)
+        >>> columns.cycle_time()  # total seconds per recipe
+        >>> columns.steps['pressure'] / columns.quantity()  # lbs per contact
+        >>> recipes = RecipeList.from_columns(columns)
+    """
+    CATEGORICAL = ('film', 'pad', 'lubricant')
+
+    def __init__(self, steps:dict, recipes:dict, categories:dict,
+                 whole:dict = None):
+        self.steps = steps
+        self.recipes = recipes
+        self.categories = categories
+        self.whole = whole    # REAL field: bool array, True where it was an int
+
+    def __len__(self):
+        return len(self.steps['recipe'])
+
+    def quantity(self):
+        '''the recipe quantity of every step row'''
+        return self.recipes['quantity'][self.steps['recipe']]
+
+    def cycle_time(self):
+        '''total step time of every recipe'''
+        np = _numpy()
+        return np.bincount(self.steps['recipe'], weights=self.steps['time'],
+                           minlength=len(self.recipes['description']))
+
+    def ramp_time(self):
+        '''speed and pressure ramp up and down time of every step row,
+           the longer of the two for each direction'''
+        np = _numpy()
+        steps = self.steps
+        return (np.maximum(steps['speed_ramp'], steps['pressure_ramp'])
+                + np.maximum(steps['speed_ramp_dn'], steps['pressure_ramp_dn']))
+
+
+def _numpy():
+    '''imports numpy, which is only needed for the columnar views'''
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("RecipeColumns needs numpy: pip install numpy") from None
+    return numpy
 
 
 if __name__=="__main__":